@@ -12,13 +12,27 @@ startup wiring, and UI-serving helpers here. Keeps the rest of the codebase
 focused on domain logic while this file glues HTTP -> db_store + static assets.
 """
 
-import torch
-import transformers
 import os
 
+# The CUDA caching allocator reads its config once, when torch initialises CUDA,
+# so this must run before anything below can import torch.
+# Encourage less fragmentation on GPUs with limited VRAM (e.g., RTX 5000).
+# Keep both names for compatibility across PyTorch versions.
+_alloc_conf_default = "expandable_segments:True"
+if not os.environ.get("PYTORCH_CUDA_ALLOC_CONF") and not os.environ.get("PYTORCH_ALLOC_CONF"):
+    os.environ["PYTORCH_CUDA_ALLOC_CONF"] = _alloc_conf_default
+    os.environ["PYTORCH_ALLOC_CONF"] = _alloc_conf_default
+elif os.environ.get("PYTORCH_CUDA_ALLOC_CONF") and not os.environ.get("PYTORCH_ALLOC_CONF"):
+    os.environ["PYTORCH_ALLOC_CONF"] = os.environ["PYTORCH_CUDA_ALLOC_CONF"]
+elif os.environ.get("PYTORCH_ALLOC_CONF") and not os.environ.get("PYTORCH_CUDA_ALLOC_CONF"):
+    os.environ["PYTORCH_CUDA_ALLOC_CONF"] = os.environ["PYTORCH_ALLOC_CONF"]
+
 # Keep startup output concise by default.
 SHOW_STARTUP_DIAGNOSTICS = os.environ.get("STARTUP_DIAGNOSTICS", "0").strip() == "1"
 if SHOW_STARTUP_DIAGNOSTICS:
+    import torch
+    import transformers
+
     print("--- ENVIRONMENT DIAGNOSTICS ---")
     print(f"torch version: {torch.__version__}")
     print(f"torch cuda: {torch.version.cuda}")
@@ -27,12 +41,6 @@ if SHOW_STARTUP_DIAGNOSTICS:
     print(f"HUGGINGFACE_SPACE_ID: {os.environ.get('HUGGINGFACE_SPACE_ID')}")
     print("-------------------------------")
 
-# Guard against unstable FP16 on GPUs that support BF16.
-if os.environ.get("FORCE_FP16", "").strip() == "1" and torch.cuda.is_available() and torch.cuda.is_bf16_supported():
-    if os.environ.get("ALLOW_FP16", "").strip() != "1":
-        print("[startup] FORCE_FP16=1 detected, but BF16 is supported. For stability, ignoring FORCE_FP16.")
-        os.environ["FORCE_FP16"] = "0"
-
 os.environ.setdefault("TORCH_USE_CUDA_DSA", "0")
 os.environ.setdefault("USE_FLASH_ATTENTION", "1")
 import json
@@ -48,13 +56,31 @@ import base64
 import time
 import re
 import mimetypes
+import hashlib
 import io
 import logging
+import sys
 import traceback
 from logging.handlers import RotatingFileHandler
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from types import MappingProxyType
 
-import medgemma4
-import medgemma27b
+try:
+    # Optional: faster JSON parsing for large legacy payloads.
+    import orjson
+except ImportError:
+    orjson = None
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+try:
+    # Optional: SIMD base64 decoder for passport/vessel image data URLs.
+    from pybase64 import b64decode as _b64decode
+except ImportError:
+    _b64decode = base64.b64decode
 
 from datetime import datetime
 from pathlib import Path
@@ -73,6 +99,7 @@ from db_store import (
     upsert_vaccine,
     delete_vaccine,
     get_credentials_rows,
+    get_status_counts,
     verify_password,
     replace_vaccine_types,
     replace_pharmacy_labels,
@@ -97,6 +124,7 @@ from db_store import (
     set_chats,
     get_chat_metrics,
     set_chat_metrics,
+    bump_chat_metric,
     get_triage_options,
     set_triage_options,
     get_triage_prompt_modules,
@@ -115,10 +143,23 @@ from db_store import (
     upsert_inventory_item,
     set_db_write_lock,
     get_db_write_lock,
+    release_connections,
+    transaction,
 )
 
 logger = logging.getLogger("uvicorn.error")
 
+
+def _json_dumps_bytes(obj, pretty: bool = False) -> bytes:
+    """Serialize `obj` to UTF-8 JSON bytes, via orjson when available."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(obj, option=option)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
 # --- Optional startup cleanup (disabled by default to speed launch) ---
 def _cleanup_and_report():
     """
@@ -126,9 +167,20 @@ def _cleanup_and_report():
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     try:
-        import subprocess as _sp
-        _sp.run("rm -rf ~/.cache/huggingface ~/.cache/torch ~/.cache/pip ~/.cache/*", shell=True, check=False)
-        _sp.run("df -h && du -sh /home/user /home/user/* ~/.cache 2>/dev/null | sort -hr | head -30", shell=True, check=False)
+        from concurrent.futures import ThreadPoolExecutor
+
+        cache_root = Path.home() / ".cache"
+        # Same targets as the old `rm -rf ~/.cache/*` (hidden entries excluded), removed in parallel.
+        targets = [p for p in cache_root.iterdir() if not p.name.startswith(".")] if cache_root.is_dir() else []
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda p: shutil.rmtree(p, ignore_errors=True) if p.is_dir() and not p.is_symlink() else p.unlink(missing_ok=True), targets))
+        for mount in ("/", str(Path.home())):
+            usage = shutil.disk_usage(mount)
+            gib = 1024 ** 3
+            print(
+                f"[startup-cleanup] {mount}: {usage.used / gib:.1f}G used, "
+                f"{usage.free / gib:.1f}G free of {usage.total / gib:.1f}G"
+            )
     except Exception as exc:
         print(f"[startup-cleanup] failed: {exc}")
 
@@ -136,16 +188,6 @@ if os.environ.get("STARTUP_CLEANUP") == "1":
     _cleanup_and_report()
 
 # --- Environment tuning for model runtime (VRAM, offline flags, cache paths) ---
-# Encourage less fragmentation on GPUs with limited VRAM (e.g., RTX 5000).
-# Keep both names for compatibility across PyTorch versions.
-_alloc_conf_default = "expandable_segments:True"
-if not os.environ.get("PYTORCH_CUDA_ALLOC_CONF") and not os.environ.get("PYTORCH_ALLOC_CONF"):
-    os.environ["PYTORCH_CUDA_ALLOC_CONF"] = _alloc_conf_default
-    os.environ["PYTORCH_ALLOC_CONF"] = _alloc_conf_default
-elif os.environ.get("PYTORCH_CUDA_ALLOC_CONF") and not os.environ.get("PYTORCH_ALLOC_CONF"):
-    os.environ["PYTORCH_ALLOC_CONF"] = os.environ["PYTORCH_CUDA_ALLOC_CONF"]
-elif os.environ.get("PYTORCH_ALLOC_CONF") and not os.environ.get("PYTORCH_CUDA_ALLOC_CONF"):
-    os.environ["PYTORCH_CUDA_ALLOC_CONF"] = os.environ["PYTORCH_ALLOC_CONF"]
 # Allow online downloads by default (HF Spaces first run needs this). We can set these to "1" after caches are warm.
 os.environ.setdefault("HF_HUB_OFFLINE", "0")
 os.environ.setdefault("TRANSFORMERS_OFFLINE", "0")
@@ -157,6 +199,8 @@ AUTO_DOWNLOAD_MODELS = os.environ.get("AUTO_DOWNLOAD_MODELS", "1" if os.environ.
 VERIFY_MODELS_ON_START = os.environ.get("VERIFY_MODELS_ON_START", "0") == "1"
 # Background model verification/download when online (non-blocking) — default off for speed
 AUTO_VERIFY_ONLINE = os.environ.get("AUTO_VERIFY_ONLINE", "0") == "1"
+# Optional model id to load and warm up in the background after startup (empty = off).
+PRELOAD_MODEL = (os.environ.get("PRELOAD_MODEL") or "").strip()
 # Detect HF runtime, but do not force remote inference by default.
 IS_HF_SPACE = bool(
     os.environ.get("HUGGINGFACE_SPACE_ID")
@@ -182,54 +226,21 @@ DISABLE_LOCAL_INFERENCE = _env_bool("DISABLE_LOCAL_INFERENCE", False)
 # Optional override: force remote inference only when on HF runtime.
 FORCE_REMOTE_INFERENCE_ON_HF = _env_bool("FORCE_REMOTE_INFERENCE_ON_HF", False)
 
-# Gemma3 masking patch for torch<2.6 (required when token_type_ids are present).
-def _torch_version_ge(major: int, minor: int) -> bool:
-    """
-     Torch Version Ge helper.
-    Detailed inline notes are included to support safe maintenance and future edits.
-    """
-    try:
-        base = torch.__version__.split("+", 1)[0]
-        parts = base.split(".")
-        return (int(parts[0]), int(parts[1])) >= (major, minor)
-    except Exception:
-        return False
-
-def _patch_gemma3_mask_for_torch():
-    """
-     Patch Gemma3 Mask For Torch helper.
-    Detailed inline notes are included to support safe maintenance and future edits.
-    """
-    if _torch_version_ge(2, 6):
-        return
-    try:
-        import transformers.models.gemma3.modeling_gemma3 as gemma_model
-        _orig_create_causal_mask_mapping = gemma_model.create_causal_mask_mapping
-
-        def _create_causal_mask_mapping_no_or(*args, **kwargs):
-            # torch<2.6 can't use or_mask_function; ignore token_type_ids for text-only.
-            """
-             Create Causal Mask Mapping No Or helper.
-            Detailed inline notes are included to support safe maintenance and future edits.
-            """
-            if len(args) >= 7:
-                args = list(args)
-                args[6] = None
-            if "token_type_ids" in kwargs:
-                kwargs = dict(kwargs)
-                kwargs["token_type_ids"] = None
-            return _orig_create_causal_mask_mapping(*args, **kwargs)
-
-        gemma_model.create_causal_mask_mapping = _create_causal_mask_mapping_no_or
-        print("[startup] patched Gemma3 mask for torch<2.6", flush=True)
-    except Exception as exc:
-        print(f"[startup] Gemma3 mask patch skipped: {exc}", flush=True)
-
-_patch_gemma3_mask_for_torch()
-
 # Local inference debug logging (disabled by default to avoid noisy console output)
 DEBUG_LOCAL_INFERENCE = os.environ.get("DEBUG_LOCAL_INFERENCE", "0") == "1"
+# Device/placement settings read on every local generate; fixed for the process.
+FORCE_CUDA = os.environ.get("FORCE_CUDA", "").strip() == "1"
+ALLOW_CPU_FALLBACK_ON_CUDA_ERROR = os.environ.get("ALLOW_CPU_FALLBACK_ON_CUDA_ERROR", "").strip() == "1"
+ENFORCE_RTX5000 = os.environ.get("ENFORCE_RTX5000", "1").strip() == "1"
+DEBUG_DEVICE = os.environ.get("DEBUG_DEVICE", "").strip() == "1"
+MODEL_MAX_GPU_MEM = os.environ.get("MODEL_MAX_GPU_MEM")
+# 27B/28B keep a dedicated cap even when MODEL_MAX_GPU_MEM is set globally.
+MODEL_MAX_GPU_MEM_27B = os.environ.get("MODEL_MAX_GPU_MEM_27B") or MODEL_MAX_GPU_MEM or "8GiB"
+MODEL_MAX_CPU_MEM = os.environ.get("MODEL_MAX_CPU_MEM", "64GiB")
+MODEL_DEVICE_MAP_27B = (os.environ.get("MODEL_DEVICE_MAP_27B", "manual") or "").strip() or "manual"
 _DEBUG_START = time.perf_counter()
+# (epoch second, formatted wall clock) so bursts of debug lines format the time once.
+_DEBUG_WALL = [0, ""]
 
 def _dbg(msg: str):
     """
@@ -237,7 +248,10 @@ def _dbg(msg: str):
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     if DEBUG_LOCAL_INFERENCE:
-        wall = time.strftime("%Y-%m-%d %H:%M:%S")
+        now_s = int(time.time())
+        if now_s != _DEBUG_WALL[0]:
+            _DEBUG_WALL[:] = [now_s, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now_s))]
+        wall = _DEBUG_WALL[1]
         elapsed = time.perf_counter() - _DEBUG_START
         print(f"[debug {wall} +{elapsed:.2f}s] {msg}", flush=True)
 
@@ -274,23 +288,15 @@ _dbg(
     )
 )
 
-import torch
-
 from fastapi import FastAPI, Request, HTTPException, status, Depends, UploadFile, File
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 from starlette.middleware.sessions import SessionMiddleware
-from transformers import (
-    AutoConfig,
-    AutoProcessor,
-    AutoModelForImageTextToText,
-    AutoTokenizer,
-    AutoModelForCausalLM,
-    BitsAndBytesConfig,
-)
-from huggingface_hub import snapshot_download
-from huggingface_hub import InferenceClient
+# torch/transformers/huggingface_hub are imported on first use (see
+# _ml_runtime and the model helpers) so remote-only deployments such as
+# HF Spaces never pay for loading the ML stack at startup.
 
 # Core config
 # Use the repo directory as the application home to avoid unwritable mount points
@@ -300,6 +306,11 @@ APP_HOME = BASE_DIR
 # Use app path as a fallback HF signal so we do not incorrectly force local-model gating.
 if not IS_HF_SPACE and str(APP_HOME).startswith("/home/user/app"):
     IS_HF_SPACE = True
+if IS_HF_SPACE:
+    # First-call compilation would delay Space launches, so default it off
+    # (an explicit operator setting wins); the runners and the spawned
+    # inference process read this from the environment.
+    os.environ.setdefault("TORCH_COMPILE", "0")
 if os.environ.get("DISABLE_LOCAL_INFERENCE") == "1":
     DISABLE_LOCAL_INFERENCE = True
 # Default persistence root to a writable local data directory unless explicitly overridden
@@ -341,10 +352,81 @@ CACHE_DIR.mkdir(parents=True, exist_ok=True)
 os.environ["HF_HOME"] = str(CACHE_DIR)
 os.environ["HUGGINGFACE_HUB_CACHE"] = str(CACHE_DIR / "hub")
 (CACHE_DIR / "hub").mkdir(parents=True, exist_ok=True)
+
+
+def _fast_clone(src: Path, dst: Path, allow_link: bool = False):
+    """
+    Copy one file as cheaply as the filesystem allows.
+
+    Tries a hardlink (only when `allow_link`, i.e. the content is never
+    modified in place), then in-kernel copy_file_range (reflink-capable on
+    btrfs/xfs), then shutil.copy2. Cross-device links fall through to copy.
+    """
+    src = Path(src)
+    dst = Path(dst)
+    if dst.exists():
+        try:
+            if os.path.samefile(src, dst):
+                return
+        except OSError:
+            pass
+        dst.unlink()
+    if allow_link:
+        try:
+            os.link(src, dst, follow_symlinks=True)
+            return
+        except OSError:
+            pass
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied <= 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                shutil.copystat(src, dst)
+                return
+        except OSError:
+            pass
+        dst.unlink(missing_ok=True)
+    shutil.copy2(src, dst)
+
+
+def _fast_clone_tree(src: Path, dst: Path, allow_link: bool = False):
+    """
+    Mirror `src` into `dst` (like copytree with dirs_exist_ok) using _fast_clone per file.
+
+    Files whose destination already has the same size and mtime are skipped,
+    so re-running a migration on every start only costs a stat per file.
+    """
+    stack = [(os.fspath(src), Path(dst))]
+    while stack:
+        src_dir, target_dir = stack.pop()
+        target_dir.mkdir(parents=True, exist_ok=True)
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                target = target_dir / entry.name
+                if entry.is_dir():
+                    stack.append((entry.path, target))
+                    continue
+                try:
+                    src_stat = entry.stat()
+                    dst_stat = target.stat()
+                    if dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+                        continue
+                except OSError:
+                    pass
+                _fast_clone(Path(entry.path), target, allow_link=allow_link)
+
+
 LEGACY_CACHE = APP_HOME / "models_cache"
 if LEGACY_CACHE.exists() and not (CACHE_DIR / ".migrated").exists() and CACHE_DIR != LEGACY_CACHE:
     try:
-        shutil.copytree(LEGACY_CACHE, CACHE_DIR, dirs_exist_ok=True)
+        # HF cache blobs are immutable, so hardlinks are safe here.
+        _fast_clone_tree(LEGACY_CACHE, CACHE_DIR, allow_link=True)
         (CACHE_DIR / ".migrated").write_text("ok", encoding="utf-8")
         print(f"[startup] migrated legacy model cache from {LEGACY_CACHE} to {CACHE_DIR}")
     except Exception as exc:
@@ -465,85 +547,104 @@ def _use_remote_inference(request: Optional[Request] = None) -> bool:
     return False
 
 
+@lru_cache(maxsize=8)
+def _sqlite_header_ok(path_str: str, size: int, mtime_ns: int) -> bool:
+    """Check the SQLite magic header; keyed by size/mtime so a replaced file is re-read."""
+    # Single positioned read; no buffered file object for a 16-byte check.
+    try:
+        fd = os.open(path_str, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        return os.pread(fd, 16, 0).startswith(b"SQLite format 3")
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
 def _is_valid_sqlite(path: Path) -> bool:
-    """
-     Is Valid Sqlite helper.
-    Detailed inline notes are included to support safe maintenance and future edits.
-    """
+    """Return True when `path` is a non-empty file with a SQLite header (one stat per call)."""
     try:
-        with open(path, "rb") as f:
-            header = f.read(16)
-        return header.startswith(b"SQLite format 3")
-    except Exception:
+        st = os.stat(path)
+    except OSError:
         return False
+    if st.st_size <= 0:
+        return False
+    return _sqlite_header_ok(str(path), st.st_size, st.st_mtime_ns)
 
 
 def _db_is_populated(path: Path) -> bool:
-    """
-     Db Is Populated helper.
-    Detailed inline notes are included to support safe maintenance and future edits.
-    """
+    """Return True when the DB holds any vessel or crew row (EXISTS probes, no full COUNT)."""
     try:
-        conn = sqlite3.connect(path)
-        cur = conn.cursor()
-        vessel_rows = 0
-        crew_rows = 0
-        try:
-            cur.execute("SELECT COUNT(*) FROM vessel")
-            vessel_rows = cur.fetchone()[0] or 0
-        except Exception:
-            pass
+        # Read-only URI: probing a missing path must not create an empty DB there.
+        conn = sqlite3.connect(f"file:{quote(str(path))}?mode=ro", uri=True)
+    except Exception:
+        return False
+    try:
+        for table in ("vessel", "crew"):
+            try:
+                if conn.execute(f"SELECT EXISTS(SELECT 1 FROM {table})").fetchone()[0]:
+                    return True
+            except sqlite3.Error:
+                # Table missing on an older/partial DB; try the next one.
+                continue
+        return False
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def _remove_db_files(path: Path):
+    """Delete a SQLite DB plus its WAL/SHM sidecars after closing pooled connections."""
+    release_connections()
+    for candidate in (path, Path(f"{path}-wal"), Path(f"{path}-shm")):
         try:
-            cur.execute("SELECT COUNT(*) FROM crew")
-            crew_rows = cur.fetchone()[0] or 0
+            candidate.unlink(missing_ok=True)
         except Exception:
             pass
-        conn.close()
-        return (vessel_rows + crew_rows) > 0
+
+
+def _fast_bootstrap_check() -> bool:
+    """Cheap import-time check: True when DB_PATH already holds a valid SQLite DB."""
+    try:
+        return _is_valid_sqlite(DB_PATH)
     except Exception:
         return False
 
 
-def _bootstrap_db(force: bool = False):
+def _slow_bootstrap_migrate():
     """
-    Ensure app.db sits beside app.py. I prefer existing data, fall back to local seeds,
-    and intentionally skip remote seeding unless explicitly enabled.
+    Replace a missing/invalid app.db. I prefer existing data, fall back to local
+    seeds, and intentionally skip remote seeding unless explicitly enabled.
     """
     if DB_PATH.exists():
-        if not force and DB_PATH.stat().st_size > 0 and _is_valid_sqlite(DB_PATH):
-            # Never overwrite a valid DB unless explicitly forced.
-            return
         # drop the stale/invalid DB before seeding
-        try:
-            DB_PATH.unlink()
-        except Exception:
-            pass
+        _remove_db_files(DB_PATH)
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # Seed sources stay untouched, so DB copies never hardlink (the app DB is
+    # written in place); _fast_clone still uses an in-kernel copy when possible.
     # 1) migrate from the previous persisted location (data/data/app.db)
-    if (
-        PREVIOUS_DATA_ROOT_DB != DB_PATH
-        and PREVIOUS_DATA_ROOT_DB.exists()
-        and PREVIOUS_DATA_ROOT_DB.stat().st_size > 0
-        and _is_valid_sqlite(PREVIOUS_DATA_ROOT_DB)
-    ):
+    if PREVIOUS_DATA_ROOT_DB != DB_PATH and _is_valid_sqlite(PREVIOUS_DATA_ROOT_DB):
         try:
-            shutil.copy2(PREVIOUS_DATA_ROOT_DB, DB_PATH)
+            _fast_clone(PREVIOUS_DATA_ROOT_DB, DB_PATH)
             print(f"[startup] migrated DB from previous data root {PREVIOUS_DATA_ROOT_DB}")
             return
         except Exception as exc:
             print(f"[startup] failed previous data-root DB copy: {exc}")
     # 2) migrate legacy packaged DB
-    if LEGACY_DB.exists() and LEGACY_DB.stat().st_size > 0 and _is_valid_sqlite(LEGACY_DB):
+    if _is_valid_sqlite(LEGACY_DB):
         try:
-            shutil.copy2(LEGACY_DB, DB_PATH)
+            _fast_clone(LEGACY_DB, DB_PATH)
             print(f"[startup] migrated legacy DB from {LEGACY_DB}")
             return
         except Exception as exc:
             print(f"[startup] failed legacy DB copy: {exc}")
     # 3) bundled seed
-    if SEED_DB_LOCAL.exists() and SEED_DB_LOCAL.stat().st_size > 0 and _is_valid_sqlite(SEED_DB_LOCAL):
+    if _is_valid_sqlite(SEED_DB_LOCAL):
         try:
-            shutil.copy2(SEED_DB_LOCAL, DB_PATH)
+            _fast_clone(SEED_DB_LOCAL, DB_PATH)
             print(f"[startup] seeded DB from {SEED_DB_LOCAL}")
             return
         except Exception as exc:
@@ -551,8 +652,68 @@ def _bootstrap_db(force: bool = False):
     print("[startup] no seed DB found; creating new empty DB (remote seed disabled)")
 
 
-_bootstrap_db()
-configure_db(DB_PATH)
+def _bootstrap_db(force: bool = False):
+    """
+    Ensure app.db sits beside app.py. Never overwrite a valid DB unless explicitly forced.
+    """
+    if not force and _fast_bootstrap_check():
+        return
+    _slow_bootstrap_migrate()
+
+
+# Set once the DB is configured. When app.db is missing/invalid the seed copy
+# runs off the import path (see _log_db_path) and requests get 503 until then.
+DB_READY = threading.Event()
+_DB_BOOTSTRAP_DEFERRED = not _fast_bootstrap_check()
+
+# Short-lived read cache for hot db_op categories; writes evict their key.
+DB_CACHE_TTL_SECONDS = 2.0
+try:
+    SETTINGS_CACHE_TTL_SECONDS = float(os.environ.get("SETTINGS_CACHE_TTL_SECONDS", "30"))
+except Exception:
+    SETTINGS_CACHE_TTL_SECONDS = 30.0
+# Settings only change through db_op or writers that evict explicitly
+# (last_prompt_verbatim), so they can live longer than the default window.
+_DB_CACHE_TTL_BY_CATEGORY = {"settings": SETTINGS_CACHE_TTL_SECONDS}
+DB_CACHED_CATEGORIES = {"settings", "vessel", "chat_metrics", "inventory", "tools", "patients"}
+# Derived cache entries that must drop together with their source category.
+_DB_CACHE_DEPENDENTS = {"patients": ("credentials", "patient_index")}
+_DB_CACHE = {}
+_DB_CACHE_LOCK = threading.Lock()
+
+
+def _db_cache_get(cat):
+    """Return a fresh cached db_op read for `cat`, or None on miss/expiry."""
+    with _DB_CACHE_LOCK:
+        entry = _DB_CACHE.get(cat)
+    if not entry or (time.monotonic() - entry[0]) > _DB_CACHE_TTL_BY_CATEGORY.get(cat, DB_CACHE_TTL_SECONDS):
+        return None
+    value = entry[1]
+    # Hand back a shallow copy so callers that tweak top-level keys don't
+    # leak edits into other readers.
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+def _db_cache_put(cat, value):
+    """Store a db_op read result for `cat`."""
+    with _DB_CACHE_LOCK:
+        _DB_CACHE[cat] = (time.monotonic(), value)
+
+
+def _db_cache_invalidate(*cats):
+    """Evict the given categories, or everything when called without args."""
+    with _DB_CACHE_LOCK:
+        if not cats:
+            _DB_CACHE.clear()
+            return
+        for cat in cats:
+            _DB_CACHE.pop(cat, None)
+            for dependent in _DB_CACHE_DEPENDENTS.get(cat, ()):
+                _DB_CACHE.pop(dependent, None)
 
 
 def _apply_db_write_lock_setting(candidate=None):
@@ -563,6 +724,9 @@ def _apply_db_write_lock_setting(candidate=None):
     1) Environment override DB_WRITE_LOCK (if set)
     2) Persisted settings_meta.db_write_lock
     """
+    # Called after every configure_db() and settings write, so cached reads
+    # may belong to a different DB or carry a stale lock flag.
+    _db_cache_invalidate()
     if DB_WRITE_LOCK_FORCED is not None:
         set_db_write_lock(DB_WRITE_LOCK_FORCED)
         return DB_WRITE_LOCK_FORCED
@@ -576,8 +740,6 @@ def _apply_db_write_lock_setting(candidate=None):
     return bool(candidate)
 
 
-_apply_db_write_lock_setting()
-
 DEFAULT_store_LABEL = "Default"
 DEFAULT_store = None
 
@@ -602,16 +764,29 @@ TEXT_MODELS = {
 VISION_MODELS = set()
 
 
-def _update_chat_metrics(store, model_name: str):
-    """Recompute per-model metrics from history_entries to keep averages accurate."""
-    metrics = get_history_latency_metrics()
-    # Persist snapshot for clients that still read chat_metrics
-    db_op("chat_metrics", metrics, store=store)
-    return metrics.get(model_name, {"count": 0, "total_ms": 0, "avg_ms": 0})
+def _update_chat_metrics(store, model_name: str, duration_ms, record: bool = True):
+    """Fold one chat duration into the per-model running metrics row."""
+    if not record:
+        # Memoized replies take ~0 ms and would drag the model's average down.
+        return get_chat_metrics().get(model_name) or {"count": 0, "total_ms": 0, "avg_ms": 0}
+    # Single UPSERT instead of rescanning history_entries and rewriting the
+    # whole table; /api/chat/metrics still derives filtered stats from history.
+    metrics = bump_chat_metric(model_name, duration_ms)
+    _db_cache_invalidate("chat_metrics")
+    return metrics
+
+
+class _FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also tolerates non-string dict keys like stdlib json."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
 
 
 # FastAPI app
-app = FastAPI(title="SailingMedAdvisor")
+# Serialize implicit endpoint responses with orjson when installed.
+DEFAULT_RESPONSE_CLASS = _FastJSONResponse if orjson is not None else JSONResponse
+app = FastAPI(title="SailingMedAdvisor", default_response_class=DEFAULT_RESPONSE_CLASS)
 session_cfg = {"secret_key": SECRET_KEY, "same_site": "lax"}
 if IS_HF_SPACE:
     # Hugging Face runs inside an iframe on huggingface.co, so we need a third-party cookie
@@ -620,11 +795,44 @@ app.add_middleware(SessionMiddleware, **session_cfg)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/uploads", StaticFiles(directory=str(UPLOAD_ROOT)), name="uploads")
 templates = Jinja2Templates(directory="templates")
-templates.env.auto_reload = True
+# Templates never change after deploy on HF, so skip the per-render mtime stat there.
+templates.env.auto_reload = _env_bool("TEMPLATE_AUTO_RELOAD", not IS_HF_SPACE)
+try:
+    (CACHE_DIR / "jinja_bc").mkdir(parents=True, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(str(CACHE_DIR / "jinja_bc"))
+except Exception as exc:
+    print(f"[startup] Jinja bytecode cache disabled: {exc}", flush=True)
+
+
+def _prewarm_templates():
+    """Compile every template once so the first real render hits a warm cache."""
+    for name in templates.env.list_templates():
+        try:
+            templates.env.get_template(name)
+        except Exception as exc:
+            _dbg(f"template prewarm skipped {name}: {exc}")
+
+if _DB_BOOTSTRAP_DEFERRED:
+
+    @app.middleware("http")
+    async def _db_ready_gate(request: Request, call_next):
+        """Answer 503 (except static assets) until the deferred DB bootstrap finishes."""
+        if not DB_READY.is_set() and not request.url.path.startswith("/static"):
+            return JSONResponse(
+                {"error": "Database is still being prepared. Please retry shortly."},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "2"},
+            )
+        return await call_next(request)
+
 
 @app.on_event("startup")
 async def _log_db_path():
     """Print the fully-resolved database path at startup for operational visibility."""
+    if _DB_BOOTSTRAP_DEFERRED and not DB_READY.is_set():
+        # Let uvicorn bind while the seed copy runs in the background.
+        asyncio.get_running_loop().run_in_executor(None, _deferred_db_bootstrap)
+    _prewarm_templates()
     try:
         print(f"[startup] Database path: {DB_PATH.resolve()}", flush=True)
         _runtime_log(
@@ -641,19 +849,16 @@ async def _log_db_path():
         print(f"[startup] Database path unavailable: {exc}", flush=True)
 
 # Model state
-device = "cuda" if torch.cuda.is_available() else "cpu"
-# Precision policy: default to bf16 when supported; allow env override
-force_fp16 = os.environ.get("FORCE_FP16", "").strip() == "1"
-if device == "cuda" and force_fp16:
-    dtype = torch.float16
-elif device == "cuda" and torch.cuda.is_bf16_supported():
-    dtype = torch.bfloat16
-elif device == "cuda":
-    dtype = torch.float16
-else:
-    dtype = torch.float32
 models = {"active_name": "", "model": None, "processor": None, "tokenizer": None, "is_text": False}
 MODEL_MUTEX = threading.Lock()
+# Local inference always runs on this one long-lived thread, so queued chats
+# wait as coroutines instead of each parking a default-pool thread on the mutex.
+_MODEL_WORKER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-worker")
+# Opt-in: run the MedGemma runners in one spawned child process so decode
+# holds that process's GIL and memory instead of the API server's.
+LOCAL_INFERENCE_PROCESS = _env_bool("LOCAL_INFERENCE_PROCESS", False)
+_INFERENCE_PROCESS = None
+_INFERENCE_PROCESS_LOCK = threading.Lock()
 MODEL_BUSY_META_LOCK = threading.Lock()
 MODEL_BUSY_META = {
     "busy": False,
@@ -669,6 +874,14 @@ except Exception:
     CHAT_QUEUE_MAX = 6
 if CHAT_QUEUE_MAX < 1:
     CHAT_QUEUE_MAX = 1
+try:
+    RESPONSE_MEMO_SIZE = max(int(os.environ.get("RESPONSE_MEMO_SIZE", "128")), 0)
+except Exception:
+    RESPONSE_MEMO_SIZE = 128
+# Exact-repeat memo of deterministic (t == 0) local generations; see _generate_response.
+_RESPONSE_MEMO = OrderedDict()
+_RESPONSE_MEMO_LOCK = threading.Lock()
+CHAT_QUEUE_WAIT_SLICE_SECONDS = 30.0
 CHAT_QUEUE_LOCK = threading.Lock()
 CHAT_QUEUE_COND = threading.Condition(CHAT_QUEUE_LOCK)
 CHAT_QUEUE_NEXT_TICKET = 1
@@ -811,7 +1024,82 @@ def _chat_queue_wait_turn(ticket: int) -> int:
                     except Exception:
                         wait_seconds = 0
                 return wait_seconds
-            CHAT_QUEUE_COND.wait(timeout=0.5)
+            # _chat_queue_release() notifies on every advance; the timeout is
+            # only a safety net, so waiters don't wake twice a second for nothing.
+            CHAT_QUEUE_COND.wait(timeout=CHAT_QUEUE_WAIT_SLICE_SECONDS)
+
+
+async def _run_on_model_worker(fn, *args):
+    """Run blocking local-inference work on the dedicated model worker thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_MODEL_WORKER, fn, *args)
+
+
+def _inference_process():
+    """Return the single-process inference pool, spawning it on first use."""
+    global _INFERENCE_PROCESS
+    with _INFERENCE_PROCESS_LOCK:
+        if _INFERENCE_PROCESS is None:
+            import multiprocessing
+            import inference_worker
+
+            _INFERENCE_PROCESS = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=inference_worker.init_worker,
+            )
+        return _INFERENCE_PROCESS
+
+
+def _inference_call(fn, *args):
+    """Run an inference_worker function in the inference child, or in-process when LOCAL_INFERENCE_PROCESS is off."""
+    global _INFERENCE_PROCESS
+    if not LOCAL_INFERENCE_PROCESS:
+        return fn(*args)
+    pool = _inference_process()
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool as exc:
+        # The child died (usually OOM); drop the pool so the next chat respawns it.
+        with _INFERENCE_PROCESS_LOCK:
+            if _INFERENCE_PROCESS is pool:
+                _INFERENCE_PROCESS = None
+        raise RuntimeError(f"Inference process exited unexpectedly: {exc}") from exc
+
+
+def _runner_generate(family: str, prompt: str, cfg: dict, reload: bool = False, **kwargs):
+    """Generate with a MedGemma runner, in the inference child when LOCAL_INFERENCE_PROCESS is set."""
+    import inference_worker
+
+    return _inference_call(inference_worker.generate, family, prompt, cfg, kwargs, reload)
+
+
+def _local_runtime_device():
+    """
+    Return ("cuda" or "cpu", CUDA error detail) for the process running the MedGemma runners.
+
+    In process mode the question goes to the inference child, so the API
+    process never imports torch or initialises CUDA.
+    """
+    import inference_worker
+
+    if not LOCAL_INFERENCE_PROCESS:
+        _ml_runtime()
+    return _inference_call(inference_worker.device_status)
+
+
+def _release_inference_memory():
+    """Free CUDA memory in the process that runs the runners after a CUDA failure."""
+    if not LOCAL_INFERENCE_PROCESS:
+        if sys.modules.get("torch") is not None:
+            import torch
+
+            torch.cuda.empty_cache()
+        return
+    import inference_worker
+
+    # The child holds the models and the allocator; unload them there.
+    _inference_call(inference_worker.unload)
 
 
 def _chat_queue_release(ticket: int) -> None:
@@ -826,44 +1114,79 @@ def _chat_queue_release(ticket: int) -> None:
         while CHAT_QUEUE_SERVING_TICKET < CHAT_QUEUE_NEXT_TICKET and CHAT_QUEUE_SERVING_TICKET not in CHAT_QUEUE_ENTRIES:
             CHAT_QUEUE_SERVING_TICKET += 1
         CHAT_QUEUE_COND.notify_all()
-# Configure SDP backends safely.
-# Keep math SDP enabled as a guaranteed fallback to avoid:
-# "No available kernel. Aborting execution."
-if device == "cuda":
-    try:
-        use_fast_sdp = os.environ.get("USE_FAST_SDP", "0").strip() == "1"
-        torch.backends.cuda.enable_flash_sdp(use_fast_sdp)
-        torch.backends.cuda.enable_mem_efficient_sdp(use_fast_sdp)
-        torch.backends.cuda.enable_math_sdp(True)
-    except Exception:
-        pass
-
-# BitsAndBytes (4-bit) is optional; enable selectively for large models.
+# BitsAndBytes (4-bit) is optional; populated by _ml_runtime() for large models.
 quant_config = None
-if device == "cuda" and os.environ.get("DISABLE_BNB", "").strip() != "1":
-    try:
-        _ = __import__("bitsandbytes")
-        bnb_compute_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
-        quant_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_compute_dtype=bnb_compute_dtype,
-            bnb_4bit_use_double_quant=True,
-            bnb_4bit_quant_type="nf4",
-            # Allow CPU offload when device_map="auto" needs it.
-            llm_int8_enable_fp32_cpu_offload=True,
-        )
-    except Exception as exc:
-        print(f"[quant] bitsandbytes unavailable; running without 4-bit quantization ({exc})", flush=True)
-    torch.backends.cuda.matmul.allow_tf32 = True
+_ML_RUNTIME_READY = False
+_ML_RUNTIME_LOCK = threading.Lock()
+
 
+@lru_cache(maxsize=1)
+def _device() -> str:
+    """Return the torch runtime device, importing torch on first use."""
+    import torch
 
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _ml_runtime():
+    """
+    Import torch and apply one-time runtime setup before local inference.
+
+    Covers the FP16 guard, the Gemma3 mask patch, SDP backend selection,
+    TF32 matmul and the optional BitsAndBytes 4-bit config.
+    """
+    global _ML_RUNTIME_READY, quant_config
+    import torch
+
+    if _ML_RUNTIME_READY:
+        return torch
+    with _ML_RUNTIME_LOCK:
+        if _ML_RUNTIME_READY:
+            return torch
+        # Guard against unstable FP16 on GPUs that support BF16.
+        from medgemma_common import bf16_supported, configure_sdp_backends, patch_gemma3_mask_for_torch
+
+        if os.environ.get("FORCE_FP16", "").strip() == "1" and torch.cuda.is_available() and bf16_supported():
+            if os.environ.get("ALLOW_FP16", "").strip() != "1":
+                print("[startup] FORCE_FP16=1 detected, but BF16 is supported. For stability, ignoring FORCE_FP16.")
+                os.environ["FORCE_FP16"] = "0"
+        # Gemma3 masking patch for torch<2.6 (required when token_type_ids are present).
+        patch_gemma3_mask_for_torch()
+        configure_sdp_backends()
+        # BitsAndBytes (4-bit) is optional; enable selectively for large models.
+        if _device() == "cuda" and os.environ.get("DISABLE_BNB", "").strip() != "1":
+            try:
+                from transformers import BitsAndBytesConfig
+
+                _ = __import__("bitsandbytes")
+                bnb_compute_dtype = torch.bfloat16 if bf16_supported() else torch.float16
+                quant_config = BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_compute_dtype=bnb_compute_dtype,
+                    bnb_4bit_use_double_quant=True,
+                    bnb_4bit_quant_type="nf4",
+                    # Allow CPU offload when device_map="auto" needs it.
+                    llm_int8_enable_fp32_cpu_offload=True,
+                )
+            except Exception as exc:
+                print(f"[quant] bitsandbytes unavailable; running without 4-bit quantization ({exc})", flush=True)
+            torch.backends.cuda.matmul.allow_tf32 = True
+        _ML_RUNTIME_READY = True
+    return torch
+
+
+# Runs of non-alphanumeric characters (Unicode-aware, matching str.isalnum).
+_SLUG_RE = re.compile(r"[\W_]+")
+
+
+@lru_cache(maxsize=128)
 def _sanitize_store(name: str) -> str:
     """
      Sanitize Store helper.
     Detailed inline notes are included to support safe maintenance and future edits.
+    Memoized: a handful of store names are re-slugged on nearly every request.
     """
-    slug = "".join(ch if ch.isalnum() else "-" for ch in (name or ""))
-    slug = re.sub("-+", "-", slug).strip("-").lower()
+    slug = _SLUG_RE.sub("-", name or "").strip("-").lower()
     return slug or "default"
 
 def _label_from_slug(slug: str) -> str:
@@ -886,28 +1209,32 @@ def _migrate_existing_to_default(store):
         new_uploads_dir = store.get("uploads") or (UPLOAD_ROOT / slug)
         legacy_uploads_dir = legacy_root / "uploads"
 
-        # Copy JSON payloads (patients, inventory, etc.) into data/<slug> if missing there
+        # Copy JSON payloads (patients, inventory, etc.) into data/<slug> if missing there.
+        # These get rewritten in place later, so they are copied rather than linked.
         if legacy_root.exists():
             for path in legacy_root.glob("*.json"):
                 dest = new_data_dir / path.name
                 if not dest.exists():
                     try:
                         dest.parent.mkdir(parents=True, exist_ok=True)
-                        shutil.copy2(path, dest)
+                        _fast_clone(path, dest)
                     except Exception:
                         pass
 
-        # Copy legacy uploads into uploads/<slug>/*
+        # Link legacy uploads into uploads/<slug>/* (upload files are replaced,
+        # never edited in place); unchanged files are skipped on later starts.
         if legacy_uploads_dir.exists():
-            for item in legacy_uploads_dir.iterdir():
+            with os.scandir(legacy_uploads_dir) as it:
+                items = list(it)
+            for item in items:
                 dest = new_uploads_dir / item.name
                 try:
                     if item.is_dir():
-                        shutil.copytree(item, dest, dirs_exist_ok=True)
+                        _fast_clone_tree(Path(item.path), dest, allow_link=True)
                     else:
                         dest.parent.mkdir(parents=True, exist_ok=True)
                         if not dest.exists():
-                            shutil.copy2(item, dest)
+                            _fast_clone(Path(item.path), dest, allow_link=True)
                 except Exception:
                     pass
 
@@ -916,6 +1243,10 @@ def _migrate_existing_to_default(store):
         pass
 
 
+# Store directories already created this process (skip repeat mkdir syscalls).
+_ENSURED_STORE_DIRS = set()
+
+
 def _store_dirs(store_label: str):
     """
      Store Dirs helper.
@@ -926,8 +1257,10 @@ def _store_dirs(store_label: str):
     data_dir = DATA_ROOT / slug
     uploads_dir = UPLOAD_ROOT / slug
     backup_dir = BACKUP_ROOT / slug
-    for path in [data_dir, uploads_dir, backup_dir]:
-        path.mkdir(parents=True, exist_ok=True)
+    for path in (data_dir, uploads_dir, backup_dir):
+        if path not in _ENSURED_STORE_DIRS:
+            path.mkdir(parents=True, exist_ok=True)
+            _ENSURED_STORE_DIRS.add(path)
     return {
         "label": store_label,
         "slug": slug,
@@ -937,9 +1270,6 @@ def _store_dirs(store_label: str):
         "db_id": ws_rec["id"],
     }
 
-DEFAULT_store = _store_dirs(DEFAULT_store_LABEL)
-_migrate_existing_to_default(DEFAULT_store)
-
 def _apply_offline_env_from_settings():
     """Honor persisted offline flags at startup so model loading respects cached-only mode."""
     try:
@@ -950,7 +1280,31 @@ def _apply_offline_env_from_settings():
     except Exception:
         pass
 
-_apply_offline_env_from_settings()
+
+
+def _finish_db_startup():
+    """Configure the DB and the state derived from it (write lock, default store, offline flags)."""
+    global DEFAULT_store
+    configure_db(DB_PATH)
+    _apply_db_write_lock_setting()
+    DEFAULT_store = _store_dirs(DEFAULT_store_LABEL)
+    _migrate_existing_to_default(DEFAULT_store)
+    _apply_offline_env_from_settings()
+    DB_READY.set()
+
+
+def _deferred_db_bootstrap():
+    """Seed/migrate app.db and finish DB startup; runs on the default executor."""
+    try:
+        _slow_bootstrap_migrate()
+        _finish_db_startup()
+        print("[startup] deferred DB bootstrap complete", flush=True)
+    except Exception:
+        logger.exception("deferred DB bootstrap failed", extra={"db_path": str(DB_PATH)})
+
+
+if not _DB_BOOTSTRAP_DEFERRED:
+    _finish_db_startup()
 
 
 def _get_store(_request: Request = None, required: bool = True):
@@ -966,7 +1320,15 @@ def _startup_model_check():
     if not VERIFY_MODELS_ON_START or DISABLE_LOCAL_INFERENCE:
         return
     print("[offline] Verifying required model cache...")
-    results = verify_required_models(download_missing=AUTO_DOWNLOAD_MODELS and not is_offline_mode())
+    # Only run the full config/weights verification for models without a snapshot dir.
+    present = [m for m in REQUIRED_MODELS if _snapshot_present(m)]
+    residual = [m for m in REQUIRED_MODELS if m not in present]
+    results = [{"model": m, "cached": True, "downloaded": False, "error": ""} for m in present]
+    if residual:
+        results += verify_required_models(
+            download_missing=AUTO_DOWNLOAD_MODELS and not is_offline_mode(),
+            model_ids=residual,
+        )
     missing = [m for m in results if not m["cached"]]
     for r in results:
         status_txt = "cached" if r["cached"] else "missing"
@@ -978,32 +1340,105 @@ def _startup_model_check():
         )
 
 
+def _try_verify_lock():
+    """
+    Take the cross-worker verify lock without blocking.
+
+    Returns (handle, acquired). Keep `handle` open for as long as the lock
+    should be held; platforms without fcntl always proceed.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None, True
+    try:
+        handle = open(CACHE_DIR / ".verify.lock", "a+")
+    except OSError:
+        return None, True
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None, False
+    return handle, True
+
+
 def _background_verify_models():
-    """Non-blocking model cache verify/download when online."""
+    """Model cache verify/download when online; only one uvicorn worker runs it."""
     if DISABLE_LOCAL_INFERENCE or not AUTO_VERIFY_ONLINE:
         return
-    # Quick check: skip if nothing is missing
-    missing = [m for m in verify_required_models(download_missing=False) if not m["cached"]]
-    if not missing:
-        return
-    if is_offline_mode():
-        print("[offline] Skipping background verify (offline mode).")
+    handle, acquired = _try_verify_lock()
+    if not acquired:
+        print("[offline] Background verify already running in another worker; skipping.")
         return
-
-    def _runner():
-        """
-         Runner helper.
-        Detailed inline notes are included to support safe maintenance and future edits.
-        """
+    try:
+        # Quick check: skip if nothing is missing (snapshot dir probe first, full check for the rest)
+        residual = [m for m in REQUIRED_MODELS if not _snapshot_present(m)]
+        if not residual:
+            return
+        missing = [m["model"] for m in verify_required_models(download_missing=False, model_ids=residual) if not m["cached"]]
+        if not missing:
+            return
+        if is_offline_mode():
+            print("[offline] Skipping background verify (offline mode).")
+            return
         try:
             print("[offline] Background verify: checking/downloading MedGemma caches...")
-            verify_required_models(download_missing=True)
+            verify_required_models(download_missing=True, model_ids=missing)
             print("[offline] Background verify complete.")
         except Exception as exc:
             print(f"[offline] Background verify failed: {exc}")
+    finally:
+        if handle is not None:
+            handle.close()
+
+
+_BACKGROUND_VERIFY_TASK = None
+
+
+@app.on_event("startup")
+async def _start_background_verify():
+    """Run the background model verify on the download executor without blocking startup."""
+    global _BACKGROUND_VERIFY_TASK
+    if DISABLE_LOCAL_INFERENCE or not AUTO_VERIFY_ONLINE:
+        return
+    loop = asyncio.get_running_loop()
+    _BACKGROUND_VERIFY_TASK = loop.run_in_executor(DOWNLOAD_EXECUTOR, _background_verify_models)
+
 
-    t = threading.Thread(target=_runner, daemon=True)
-    t.start()
+def _preload_model():
+    """Load PRELOAD_MODEL and run short warmup generations so the first chat skips the cold start."""
+    model_name = PRELOAD_MODEL
+    cached, cache_err = model_cache_status(model_name)
+    if not cached:
+        print(f"[preload] skipping {model_name}: {cache_err or 'not cached'}", flush=True)
+        return
+    started = time.perf_counter()
+    warmup_cfg = {"tk": 8, "t": 0, "p": 1.0, "k": 50, "rep_penalty": 1.0}
+    try:
+        # Hold the model mutex so a real chat waits for the load instead of racing it.
+        with MODEL_MUTEX:
+            for _ in range(2):
+                _generate_response_local(model_name, False, "warmup", warmup_cfg, trace_id="preload")
+            # In process mode the warmup ran in the inference child; leave CUDA alone here.
+            if not LOCAL_INFERENCE_PROCESS:
+                torch = _ml_runtime()
+                if torch.cuda.is_available():
+                    torch.cuda.synchronize()
+                    torch.cuda.empty_cache()
+        print(f"[preload] {model_name} warm in {time.perf_counter() - started:.1f}s", flush=True)
+        _runtime_log("model.preload.ready", model=model_name, elapsed_ms=int((time.perf_counter() - started) * 1000))
+    except Exception as exc:
+        print(f"[preload] {model_name} warmup failed: {exc}", flush=True)
+        _runtime_log("model.preload.failed", level=logging.WARNING, model=model_name, error=str(exc))
+
+
+@app.on_event("startup")
+async def _start_model_preload():
+    """Kick off PRELOAD_MODEL warmup on a daemon thread once the server is starting."""
+    if not PRELOAD_MODEL or DISABLE_LOCAL_INFERENCE:
+        return
+    threading.Thread(target=_preload_model, name="model-preload", daemon=True).start()
 
 
 def _heartbeat(label: str, interval: float = 2.0, stop_event: threading.Event = None):
@@ -1017,9 +1452,25 @@ def unload_model():
     models["tokenizer"] = None
     models["active_name"] = ""
     models["is_text"] = False
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
-    _dbg("model unloaded and CUDA cache cleared")
+    # Nothing to release if torch was never imported in this process.
+    if sys.modules.get("torch") is not None:
+        from medgemma_common import release_cuda_cache
+
+        # Only flush the allocator under memory pressure; a following load reuses the blocks.
+        cleared = release_cuda_cache()
+        _dbg(f"model unloaded (CUDA cache cleared={cleared})")
+        return
+    _dbg("model unloaded")
+
+
+_MED_PLACEHOLDERS = frozenset({"", "medication", "med"})
+
+
+def _norm_med_field(val):
+    """Normalize a medication name/strength for case-insensitive comparison."""
+    v = (val or "").strip().lower()
+    # Treat empty strings and generic placeholders as non-matches
+    return "" if v in _MED_PLACEHOLDERS else v
 
 
 def _same_med(a, b):
@@ -1070,18 +1521,11 @@ def _same_med(a, b):
         - Form (tablet, capsule, etc.) is NOT considered in matching
         - This is used by WHO list imports
     """
-
-    def norm(val):
-        """Normalize a medication name/strength for case-insensitive comparison."""
-        v = (val or "").strip().lower()
-        # Treat empty strings and generic placeholders as non-matches
-        return "" if v in {"", "medication", "med"} else v
-
     # Extract and normalize generic names
-    ga, gb = norm(a.get("genericName")), norm(b.get("genericName"))
+    ga, gb = _norm_med_field(a.get("genericName")), _norm_med_field(b.get("genericName"))
     
     # Extract and normalize strengths
-    sa, sb = norm(a.get("strength")), norm(b.get("strength"))
+    sa, sb = _norm_med_field(a.get("strength")), _norm_med_field(b.get("strength"))
     
     # Both must have real (non-placeholder) generic names
     if not ga or not gb:
@@ -1121,8 +1565,16 @@ def load_model(model_name: str, allow_cpu_large: bool = False):
     if models["active_name"] == model_name:
         _dbg(f"load_model: model already active ({model_name})")
         return
-    force_cuda = os.environ.get("FORCE_CUDA", "").strip() == "1"
-    runtime_device = "cuda" if torch.cuda.is_available() else "cpu"
+    torch = _ml_runtime()
+    from transformers import (
+        AutoProcessor,
+        AutoModelForImageTextToText,
+        AutoTokenizer,
+        AutoModelForCausalLM,
+    )
+
+    force_cuda = FORCE_CUDA
+    runtime_device = _device()
     _dbg(
         f"load_model: name={model_name} runtime_device={runtime_device} force_cuda={force_cuda} allow_cpu_large={allow_cpu_large}"
     )
@@ -1164,25 +1616,25 @@ def load_model(model_name: str, allow_cpu_large: bool = False):
     else:
         device_map = "auto" if runtime_device == "cuda" else "cpu"
     if runtime_device == "cuda" and is_large_medgemma:
-        # Prefer dedicated cap for 27B/28B even when MODEL_MAX_GPU_MEM is set globally.
-        max_mem_gpu = os.environ.get("MODEL_MAX_GPU_MEM_27B") or os.environ.get("MODEL_MAX_GPU_MEM") or "8GiB"
+        max_mem_gpu = MODEL_MAX_GPU_MEM_27B
     else:
-        max_mem_gpu = os.environ.get("MODEL_MAX_GPU_MEM", "15GiB")
-    max_mem_cpu = os.environ.get("MODEL_MAX_CPU_MEM", "64GiB")
+        max_mem_gpu = MODEL_MAX_GPU_MEM or "15GiB"
+    max_mem_cpu = MODEL_MAX_CPU_MEM
     max_memory = {0: max_mem_gpu, "cpu": max_mem_cpu} if runtime_device == "cuda" else None
     # Enforce expected GPU for local MedGemma runs.
+    from medgemma_common import bf16_supported, cuda_device_info
+
     if runtime_device == "cuda" and is_medgemma and not IS_HF_SPACE:
-        enforce_rtx = os.environ.get("ENFORCE_RTX5000", "1").strip() == "1"
-        if enforce_rtx:
-            gpu_name = torch.cuda.get_device_name(0)
+        if ENFORCE_RTX5000:
+            gpu_name = cuda_device_info()[1]
             if "RTX 5000" not in gpu_name.upper():
                 raise RuntimeError(f"Unexpected GPU detected: '{gpu_name}'. Expected RTX 5000.")
-        if not torch.cuda.is_bf16_supported():
+        if not bf16_supported():
             raise RuntimeError("MedGemma requires bfloat16 for stable inference on this GPU.")
 
     # On CPU, use float32; on CUDA pick a safe GPU dtype
     if runtime_device == "cuda":
-        load_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        load_dtype = torch.bfloat16 if bf16_supported() else torch.float16
     else:
         load_dtype = torch.float32
     _dbg(
@@ -1195,8 +1647,10 @@ def load_model(model_name: str, allow_cpu_large: bool = False):
         "local_files_only": True,
     }
     if runtime_device == "cuda" and is_medgemma:
-        # Avoid flash/SDPA instability on older RTX cards.
-        model_kwargs["attn_implementation"] = "eager"
+        # Fused SDPA/FA2 on sm_80+; older RTX cards keep eager for stability.
+        from medgemma_common import pick_attn_implementation
+
+        model_kwargs["attn_implementation"] = pick_attn_implementation(gpu_only=device_map == "cuda")
     if runtime_device == "cuda":
         use_quant = quant_config is not None and ("27b" in model_name.lower() or "28b" in model_name.lower())
         if is_large_medgemma and quant_config is None:
@@ -1209,7 +1663,7 @@ def load_model(model_name: str, allow_cpu_large: bool = False):
             }
         )
         _dbg(f"load_model: use_quant={use_quant}")
-    if force_cuda or os.environ.get("DEBUG_DEVICE", "").strip() == "1":
+    if force_cuda or DEBUG_DEVICE:
         print(
             f"[model] runtime_device={runtime_device} device_map={device_map} dtype={load_dtype} force_cuda={force_cuda}",
             flush=True,
@@ -1258,7 +1712,7 @@ def load_model(model_name: str, allow_cpu_large: bool = False):
             _dbg(f"load_model: model.to('cuda') in {time.perf_counter() - t_move:.2f}s")
         except Exception as exc:
             raise RuntimeError(f"CUDA_MOVE_FAILED: {exc}")
-    if force_cuda or os.environ.get("DEBUG_DEVICE", "").strip() == "1":
+    if force_cuda or DEBUG_DEVICE:
         model_obj = models.get("model")
         model_dev = getattr(model_obj, "device", "n/a")
         model_map = getattr(model_obj, "hf_device_map", None)
@@ -1272,12 +1726,10 @@ def load_model(model_name: str, allow_cpu_large: bool = False):
     _dbg(f"load_model: load complete in {time.perf_counter() - t0:.2f}s")
 
 
-def get_defaults():
-    """
-    Get Defaults helper.
-    Detailed inline notes are included to support safe maintenance and future edits.
-    """
-    return {
+@lru_cache(maxsize=1)
+def _static_defaults():
+    """Build the immutable part of the settings defaults once per process."""
+    return MappingProxyType({
         "triage_instruction": "Act as Lead Clinician. Priority: Life-saving protocols. Format: ## ASSESSMENT, ## PROTOCOL.",
         "inquiry_instruction": "Act as Medical Librarian. Focus: Academic research and pharmacology.",
         "tr_temp": 0.1,
@@ -1291,10 +1743,11 @@ def get_defaults():
         "rep_penalty": 1.1,
         "mission_context": "Isolated Medical Station offshore.",
         "user_mode": "user",
-        "db_write_lock": bool(get_db_write_lock()),
+        # Placeholder keeps key order; get_defaults() fills in the live value.
+        "db_write_lock": False,
         "db_write_lock_forced": DB_WRITE_LOCK_FORCED is not None,
         "last_prompt_verbatim": "",
-        "vaccine_types": [
+        "vaccine_types": (
             "Diphtheria, Tetanus, and Pertussis (DTaP/Tdap)",
             "Polio (IPV/OPV)",
             "Measles, Mumps, Rubella (MMR)",
@@ -1312,11 +1765,39 @@ def get_defaults():
             "Japanese Encephalitis",
             "Rabies",
             "Cholera",
-        ],
-    }
+        ),
+    })
+
+
+def get_defaults():
+    """Return a fresh, mutable copy of the settings defaults."""
+    defaults = dict(_static_defaults())
+    defaults["vaccine_types"] = list(defaults["vaccine_types"])
+    defaults["db_write_lock"] = bool(get_db_write_lock())
+    return defaults
+
+
+def db_op(cat, data=None, store=None):
+    """
+    Central shim for data access. Hot read-mostly categories are served from a
+    short TTL cache; any write through here evicts that category.
+    """
+    if data is not None:
+        try:
+            return _db_op_uncached(cat, data, store)
+        finally:
+            _db_cache_invalidate(cat)
+    if cat not in DB_CACHED_CATEGORIES:
+        return _db_op_uncached(cat, data, store)
+    cached = _db_cache_get(cat)
+    if cached is not None:
+        return cached
+    loaded = _db_op_uncached(cat, data, store)
+    _db_cache_put(cat, loaded)
+    return _db_cache_get(cat)
 
 
-def db_op(cat, data=None, store=None):
+def _db_op_uncached(cat, data=None, store=None):
     """
     Central shim for data access. Everything is single-store now; I keep the
     existing signature so the rest of the app doesn't need to change. Each
@@ -1376,7 +1857,7 @@ def db_op(cat, data=None, store=None):
         legacy_path = (DEFAULT_store or {}).get("data", DATA_ROOT) / f"{category}.json"
         if legacy_path.exists():
             try:
-                return json.loads(legacy_path.read_text() or "[]")
+                return _json_loads(legacy_path.read_bytes() or b"[]")
             except Exception:
                 return None
         return None
@@ -1399,8 +1880,9 @@ def db_op(cat, data=None, store=None):
             if not isinstance(data, list):
                 raise ValueError("Patients payload must be a JSON array.")
             try:
-                set_patients(data)
-                delete_patients_doc()
+                with transaction():
+                    set_patients(data)
+                    delete_patients_doc()
                 return data
             except Exception:
                 logger.exception("patients save failed", extra={"db_path": str(DB_PATH)})
@@ -1421,19 +1903,21 @@ def db_op(cat, data=None, store=None):
         if cat == "settings":
             if not isinstance(data, dict):
                 raise ValueError("Settings payload must be a JSON object.")
-            # Persist lookup lists to their own tables
-            if "vaccine_types" in data:
-                replace_vaccine_types(data.get("vaccine_types") or [])
-            if "pharmacy_labels" in data:
-                replace_pharmacy_labels(data.get("pharmacy_labels") or [])
-            # Persist model params to table
-            set_model_params(data)
-            # Persist meta settings to table
-            set_settings_meta(
-                user_mode=data.get("user_mode"),
-                offline_force_flags=data.get("offline_force_flags"),
-                db_write_lock=data.get("db_write_lock"),
-            )
+            # One transaction (single commit) for all settings tables.
+            with transaction():
+                # Persist lookup lists to their own tables
+                if "vaccine_types" in data:
+                    replace_vaccine_types(data.get("vaccine_types") or [])
+                if "pharmacy_labels" in data:
+                    replace_pharmacy_labels(data.get("pharmacy_labels") or [])
+                # Persist model params to table
+                set_model_params(data)
+                # Persist meta settings to table
+                set_settings_meta(
+                    user_mode=data.get("user_mode"),
+                    offline_force_flags=data.get("offline_force_flags"),
+                    db_write_lock=data.get("db_write_lock"),
+                )
             _apply_db_write_lock_setting(data.get("db_write_lock"))
             return {**get_defaults(), **data}
         if cat == "inventory":
@@ -1616,12 +2100,15 @@ def triage_condition_meta(conditions: dict):
     return meta
 
 
+_TRIAGE_KEY_STRIP = re.compile(r"[^a-z0-9]+").sub
+
+
 def _normalize_triage_key(value: str) -> str:
     """
      Normalize Triage Key helper.
     Detailed inline notes are included to support safe maintenance and future edits.
     """
-    return re.sub(r"[^a-z0-9]+", "", (value or "").strip().lower())
+    return _TRIAGE_KEY_STRIP("", (value or "").strip().lower())
 
 
 def _lookup_tree_node(options, selected_value):
@@ -1842,6 +2329,9 @@ def assemble_system_prompt(selections, user_metadata_block=""):
     return "\n\n".join(section for section in sections if section.strip()).strip()
 
 
+_EXCLUDED_FLAG_VALUES = frozenset({"true", "1", "yes"})
+
+
 def _is_resource_excluded(item):
     """
      Is Resource Excluded helper.
@@ -1849,10 +2339,32 @@ def _is_resource_excluded(item):
     """
     val = item.get("excludeFromResources")
     if isinstance(val, str):
-        return val.strip().lower() in {"true", "1", "yes"}
+        return val.strip().lower() in _EXCLUDED_FLAG_VALUES
     return bool(val)
 
 
+# Keyword rules for _categorize_supply_name, checked in order (first match wins).
+# Each keyword list is folded into one precompiled alternation.
+_SUPPLY_CATEGORY_RULES = tuple(
+    (label, re.compile("|".join(re.escape(k) for k in keywords)).search)
+    for label, keywords in (
+        ("Burn care", ("burn", "water-jel", "water jel", "sunburn", "aloe")),
+        ("Wound care & dressings", ("bandage", "gauze", "pad", "dressing", "tegaderm", "steri", "strip", "sponge", "wound")),
+        ("Splints & supports", ("splint", "elastic bandage", "moleskin", "padding", "support")),
+        ("Antiseptics & hygiene", ("betadine", "antiseptic", "alcohol", "sanitizer", "wipe", "brush")),
+        ("Airway & breathing", ("cpr", "respir", "airway", "nasopharyngeal", "rescue mask")),
+        ("Diagnostics & monitoring", ("stethoscope", "thermometer", "blood pressure", "bp")),
+        ("Instruments & tools", ("forceps", "hemostat", "scissors", "tweezers", "needle holder", "scalpel", "spatula", "snips", "pliers")),
+        ("Eye care", ("eye", "eyewash", "eye wash")),
+        ("Dental", ("dent", "dental")),
+        ("PPE", ("glove", "ppe")),
+        ("Lubricants & gels", ("lubricat", "surgilube", "jelly", "gel")),
+        ("Survival & utility", ("blanket", "bivvy", "matches", "duct tape", "safety pin", "toe protector")),
+        ("Irrigation & syringes", ("enema", "syringe")),
+    )
+)
+
+
 def _categorize_supply_name(name: str) -> str:
     """
      Categorize Supply Name helper.
@@ -1861,32 +2373,9 @@ def _categorize_supply_name(name: str) -> str:
     if not name:
         return "Other"
     n = name.strip().lower()
-    if any(k in n for k in ["burn", "water-jel", "water jel", "sunburn", "aloe"]):
-        return "Burn care"
-    if any(k in n for k in ["bandage", "gauze", "pad", "dressing", "tegaderm", "steri", "strip", "sponge", "wound"]):
-        return "Wound care & dressings"
-    if any(k in n for k in ["splint", "elastic bandage", "moleskin", "padding", "support"]):
-        return "Splints & supports"
-    if any(k in n for k in ["betadine", "antiseptic", "alcohol", "sanitizer", "wipe", "brush"]):
-        return "Antiseptics & hygiene"
-    if any(k in n for k in ["cpr", "respir", "airway", "nasopharyngeal", "rescue mask"]):
-        return "Airway & breathing"
-    if any(k in n for k in ["stethoscope", "thermometer", "blood pressure", "bp"]):
-        return "Diagnostics & monitoring"
-    if any(k in n for k in ["forceps", "hemostat", "scissors", "tweezers", "needle holder", "scalpel", "spatula", "snips", "pliers"]):
-        return "Instruments & tools"
-    if any(k in n for k in ["eye", "eyewash", "eye wash"]):
-        return "Eye care"
-    if any(k in n for k in ["dent", "dental"]):
-        return "Dental"
-    if any(k in n for k in ["glove", "ppe"]):
-        return "PPE"
-    if any(k in n for k in ["lubricat", "surgilube", "jelly", "gel"]):
-        return "Lubricants & gels"
-    if any(k in n for k in ["blanket", "bivvy", "matches", "duct tape", "safety pin", "toe protector"]):
-        return "Survival & utility"
-    if "enema" in n or "syringe" in n:
-        return "Irrigation & syringes"
+    for label, search in _SUPPLY_CATEGORY_RULES:
+        if search(n):
+            return label
     return "Other"
 
 
@@ -1955,6 +2444,31 @@ def _patient_display_name(record, fallback):
     return combined or fallback
 
 
+def _patient_index(store):
+    """Return {"by_key": {id or name: record}} over the crew records for `store`."""
+    cached = _db_cache_get("patient_index")
+    if cached is not None:
+        return cached
+    by_key = {}
+    for p in db_op("patients", store=store):
+        # One map for both keys, first record in list order wins: the same
+        # answer as the old linear scan even when a name equals another id.
+        for key in (p.get("id"), p.get("name")):
+            if key:
+                by_key.setdefault(key, p)
+    # Nested so cache hits copy a one-key wrapper, not the whole map.
+    index = {"by_key": by_key}
+    _db_cache_put("patient_index", index)
+    return index
+
+
+def _find_patient(p_name, store):
+    """Return the first crew record whose id or name equals `p_name`, or None."""
+    if not p_name:
+        return None
+    return _patient_index(store)["by_key"].get(p_name)
+
+
 def lookup_patient_display_name(p_name, store, default="Unnamed Crew"):
     """
     Lookup Patient Display Name helper.
@@ -1963,19 +2477,48 @@ def lookup_patient_display_name(p_name, store, default="Unnamed Crew"):
     if not p_name:
         return default
     try:
-        patients = db_op("patients", store=store)
+        rec = _find_patient(p_name, store)
     except Exception:
         return default
-    rec = next(
-        (
-            p
-            for p in patients
-            if (p.get("id") and p.get("id") == p_name)
-            or (p.get("name") and p.get("name") == p_name)
-        ),
-        None,
-    )
-    return _patient_display_name(rec, p_name or default)
+    return _patient_display_name(rec, p_name)
+
+
+# (record key, prompt label) pairs rendered for each vaccine entry, in order.
+_VAX_FIELDS = (
+    ("dateAdministered", "Date"),
+    ("doseNumber", "Dose"),
+    ("tradeNameManufacturer", "Trade/Manufacturer"),
+    ("lotNumber", "Lot"),
+    ("provider", "Provider"),
+    ("providerCountry", "Provider Country"),
+    ("nextDoseDue", "Next Dose Due"),
+    ("expirationDate", "Expiration"),
+    ("siteRoute", "Site/Route"),
+    ("reactions", "Reactions"),
+)
+
+
+def _format_vaccines(vax_list):
+    """Render a crew member's vaccine records as a single prompt line."""
+    if not isinstance(vax_list, list) or not vax_list:
+        return "No vaccines recorded."
+    formatted = []
+    for v in vax_list:
+        if not isinstance(v, dict):
+            continue
+        v_type = v.get("vaccineType") or "Vaccine"
+        details = "; ".join(f"{label}: {val}" for key, label in _VAX_FIELDS if (val := v.get(key)))
+        formatted.append(f"{v_type} ({details})" if details else v_type)
+    return "; ".join(formatted) if formatted else "No vaccines recorded."
+
+
+def _join_prompt_sections(sections, dynamic: int):
+    """Join non-empty prompt sections; also return the length of the leading block before the last `dynamic` ones."""
+    static = [section for section in sections[:-dynamic] if section]
+    tail = [section for section in sections[-dynamic:] if section]
+    prompt = "\n\n".join(static + tail)
+    prefix_chars = len("\n\n".join(static)) + 2 if static and tail else 0
+    return prompt, prefix_chars
 
 
 def build_prompt(settings, mode, msg, p_name, store, triage_selections=None, triage_conditions=None):
@@ -2015,7 +2558,7 @@ def build_prompt(settings, mode, msg, p_name, store, triage_selections=None, tri
             + f"instruction_chars={len(instruction or '')} "
             + f"query_chars={len(msg or '')}"
         )
-        prompt = "\n\n".join(section for section in prompt_sections if section.strip())
+        prompt, prefix_chars = _join_prompt_sections(prompt_sections, dynamic=1)
         cfg = {
             "t": safe_float(settings.get("in_temp", 0.6), 0.6),
             "tk": safe_int(settings.get("in_tok", 2048), 2048),
@@ -2024,50 +2567,6 @@ def build_prompt(settings, mode, msg, p_name, store, triage_selections=None, tri
             "rep_penalty": rep_penalty,
         }
     else:
-        pharma_items = {}
-        equip_items = {}
-        consumable_items = {}
-        for m in db_op("inventory", store=store):
-            # Prefer generic names in prompts to keep medication references concise.
-            item_name = m.get("genericName") or m.get("name") or m.get("brandName")
-            if _is_resource_excluded(m):
-                continue
-            if not item_name:
-                continue
-            cat = (m.get("type") or "medication").strip().lower()
-            key = (item_name or "").strip().lower()
-            if not key:
-                continue
-            if cat in {"medication", ""}:
-                pharma_items[key] = item_name
-            elif cat == "consumable":
-                consumable_items[key] = item_name
-            elif cat == "equipment":
-                equip_items[key] = item_name
-            else:
-                # Default unknown types to medication so they are not dropped
-                pharma_items[key] = item_name
-        pharma_list = [pharma_items[k] for k in sorted(pharma_items)]
-        equip_list = [equip_items[k] for k in sorted(equip_items)]
-        consumable_list = [consumable_items[k] for k in sorted(consumable_items)]
-        pharma_str = ", ".join(pharma_list)
-        equip_str = ", ".join(equip_list)
-        consumable_str = ", ".join(consumable_list)
-
-        tool_items = list(db_op("tools", store=store))
-        equipment_items = []
-        consumable_tools = []
-        for t in tool_items:
-            t_type = (t.get("type") or "").strip().lower()
-            if t_type == "consumable":
-                consumable_tools.append(t)
-            else:
-                equipment_items.append(t)
-        equipment_items.sort(key=lambda t: (t.get("name") or "").lower())
-        consumable_tools.sort(key=lambda t: (t.get("name") or "").lower())
-
-        equipment_total = len(equipment_items)
-        consumable_total = len(consumable_tools)
         tier_entries = []
 
         def _tier_entry(name, item_type, tier, cat):
@@ -2091,91 +2590,67 @@ def build_prompt(settings, mode, msg, p_name, store, triage_selections=None, tri
                 parts.append(f"[CAT: {cat_val}]")
             return " ".join(parts)
 
-        for med in db_op("inventory", store=store):
-            if _is_resource_excluded(med):
+        pharma_items = {}
+        equip_items = {}
+        consumable_items = {}
+        # Unknown types default to medication so they are not dropped.
+        cat_map = {"medication": pharma_items, "": pharma_items, "consumable": consumable_items, "equipment": equip_items}
+        for m in db_op("inventory", store=store):
+            if _is_resource_excluded(m):
+                continue
+            # Prefer generic names in prompts to keep medication references concise.
+            item_name = m.get("genericName") or m.get("name") or m.get("brandName")
+            if not item_name:
                 continue
-            med_name = med.get("genericName") or med.get("name") or med.get("brandName")
-            entry = _tier_entry(med_name, "pharma", med.get("priorityTier"), med.get("tierCategory"))
+            entry = _tier_entry(item_name, "pharma", m.get("priorityTier"), m.get("tierCategory"))
             if entry:
                 tier_entries.append(entry)
-        for tool in tool_items:
-            if _is_resource_excluded(tool):
+            key = item_name.strip().lower()
+            if not key:
                 continue
+            cat = (m.get("type") or "medication").strip().lower()
+            cat_map.get(cat, pharma_items)[key] = item_name
+        pharma_list = sorted(pharma_items.values(), key=lambda n: n.strip().lower())
+        equip_list = sorted(equip_items.values(), key=lambda n: n.strip().lower())
+        consumable_list = sorted(consumable_items.values(), key=lambda n: n.strip().lower())
+        pharma_str = ", ".join(pharma_list)
+        equip_str = ", ".join(equip_list)
+        consumable_str = ", ".join(consumable_list)
+
+        equipment_names = []
+        consumable_names = []
+        equipment_total = 0
+        consumable_total = 0
+        for tool in db_op("tools", store=store):
             tool_name = tool.get("name")
-            tool_type = (tool.get("type") or "").strip().lower()
-            item_type = "consumable" if tool_type == "consumable" else "equipment"
+            is_consumable = (tool.get("type") or "").strip().lower() == "consumable"
+            if is_consumable:
+                consumable_total += 1
+            else:
+                equipment_total += 1
+            if tool_name:
+                (consumable_names if is_consumable else equipment_names).append(tool_name)
+            if _is_resource_excluded(tool):
+                continue
+            item_type = "consumable" if is_consumable else "equipment"
             entry = _tier_entry(tool_name, item_type, tool.get("priorityTier"), tool.get("tierCategory"))
             if entry:
                 tier_entries.append(entry)
+        equipment_names.sort(key=str.lower)
+        consumable_names.sort(key=str.lower)
         tier_payload = " ".join(tier_entries)
 
-        patient_record = next(
-            (
-                p
-                for p in db_op("patients", store=store)
-                if (p_name and p.get("id") == p_name) or (p_name and p.get("name") == p_name)
-            ),
-            {},
-        )
-        display_name = _patient_display_name(patient_record, p_name or "Unnamed Crew")
+        if p_name:
+            patient_record = _find_patient(p_name, store) or {}
+            display_name = _patient_display_name(patient_record, p_name)
+        else:
+            patient_record = {}
+            display_name = "Unnamed Crew"
         p_hist = patient_record.get("history", "No records.")
         p_sex = patient_record.get("sex") or patient_record.get("gender") or "Unknown"
         p_birth = patient_record.get("birthdate") or "Unknown"
         vaccines = patient_record.get("vaccines") or []
 
-        def _format_vaccines(vax_list):
-            """
-             Format Vaccines helper.
-            Detailed inline notes are included to support safe maintenance and future edits.
-            """
-            if not isinstance(vax_list, list) or not vax_list:
-                return "No vaccines recorded."
-            formatted = []
-            for v in vax_list:
-                if not isinstance(v, dict):
-                    continue
-                parts = []
-                v_type = v.get("vaccineType") or "Vaccine"
-                date = v.get("dateAdministered")
-                dose = v.get("doseNumber")
-                trade = v.get("tradeNameManufacturer")
-                lot = v.get("lotNumber")
-                provider = v.get("provider")
-                provider_country = v.get("providerCountry")
-                next_due = v.get("nextDoseDue")
-                exp = v.get("expirationDate")
-                site = v.get("siteRoute")
-                reactions = v.get("reactions")
-                if date:
-                    parts.append(f"Date: {date}")
-                if dose:
-                    parts.append(f"Dose: {dose}")
-                if trade:
-                    parts.append(f"Trade/Manufacturer: {trade}")
-                if lot:
-                    parts.append(f"Lot: {lot}")
-                if provider:
-                    parts.append(f"Provider: {provider}")
-                if provider_country:
-                    parts.append(f"Provider Country: {provider_country}")
-                if next_due:
-                    parts.append(f"Next Dose Due: {next_due}")
-                if exp:
-                    parts.append(f"Expiration: {exp}")
-                if site:
-                    parts.append(f"Site/Route: {site}")
-                if reactions:
-                    parts.append(f"Reactions: {reactions}")
-                details = "; ".join(parts)
-                if details:
-                    formatted.append(f"{v_type} ({details})")
-                else:
-                    formatted.append(v_type)
-            return "; ".join(formatted) if formatted else "No vaccines recorded."
-
-        equipment_names = [t.get("name") for t in equipment_items if t.get("name")]
-        consumable_names = [t.get("name") for t in consumable_tools if t.get("name")]
-
         def _compact_inventory(values, limit):
             """
              Compact Inventory helper.
@@ -2218,7 +2693,8 @@ def build_prompt(settings, mode, msg, p_name, store, triage_selections=None, tri
             ] if section
         )
         condition_meta = triage_condition_meta(triage_conditions or {})
-        condition_lines = [f"- {k}: {v}" for k, v in condition_meta.items() if (v or "").strip()]
+        # triage_condition_meta only keeps non-empty, stripped values.
+        condition_lines = [f"- {k}: {v}" for k, v in condition_meta.items()]
         condition_section = _section_block("PATIENT CONDITION", "\n".join(condition_lines))
         mission_section = _section_block("MISSION CONTEXT", mission_context)
         general_section = _section_block("TRIAGE MODE GENERAL", settings.get("triage_instruction") or "")
@@ -2241,8 +2717,8 @@ def build_prompt(settings, mode, msg, p_name, store, triage_selections=None, tri
                     section for section in [
                         general_section,
                         pathway_section,
-                    ] if section and section.strip()
-                ).strip()
+                    ] if section
+                )
                 prompt_sections = [
                     mission_section,
                     general_section,
@@ -2280,26 +2756,29 @@ def build_prompt(settings, mode, msg, p_name, store, triage_selections=None, tri
                 condition_section,
                 situation_section,
             ]
-        _dbg(
-            "prompt_breakdown[triage]: "
-            + f"mission_chars={len(mission_context or '')} "
-            + f"instruction_chars={len(triage_instruction or '')} "
-            + f"pharma_count={len(pharma_list)} pharma_chars={len(pharma_str)} "
-            + f"equip_count={len(equip_list)} equip_chars={len(equip_str)} "
-            + f"consumable_count={len(consumable_list)} consumable_chars={len(consumable_str)} "
-            + f"equipment_total={equipment_total} "
-            + f"consumable_total={consumable_total} "
-            + f"tier_entries={len(tier_entries)} tier_chars={len(tier_payload)} "
-            + f"patient_hist_chars={len(p_hist or '')} "
-            + f"vaccines_count={len(vaccines) if isinstance(vaccines, list) else 0} "
-            + f"modular={using_modular_prompt} "
-            + f"supplemented={supplement_with_general} "
-            + f"pathway_reason={prompt_meta.get('triage_pathway_reason') or ''} "
-            + f"triage_selections={json.dumps(triage_selections or {})} "
-            + f"triage_conditions={json.dumps(triage_conditions or {})} "
-            + f"situation_chars={len(msg or '')}"
-        )
-        prompt = "\n\n".join(section for section in prompt_sections if section.strip())
+        # The breakdown JSON-encodes the selections; skip building it unless debugging.
+        if DEBUG_LOCAL_INFERENCE:
+            _dbg(
+                "prompt_breakdown[triage]: "
+                + f"mission_chars={len(mission_context or '')} "
+                + f"instruction_chars={len(triage_instruction or '')} "
+                + f"pharma_count={len(pharma_list)} pharma_chars={len(pharma_str)} "
+                + f"equip_count={len(equip_list)} equip_chars={len(equip_str)} "
+                + f"consumable_count={len(consumable_list)} consumable_chars={len(consumable_str)} "
+                + f"equipment_total={equipment_total} "
+                + f"consumable_total={consumable_total} "
+                + f"tier_entries={len(tier_entries)} tier_chars={len(tier_payload)} "
+                + f"patient_hist_chars={len(p_hist or '')} "
+                + f"vaccines_count={len(vaccines) if isinstance(vaccines, list) else 0} "
+                + f"modular={using_modular_prompt} "
+                + f"supplemented={supplement_with_general} "
+                + f"pathway_reason={prompt_meta.get('triage_pathway_reason') or ''} "
+                + f"triage_selections={json.dumps(triage_selections or {})} "
+                + f"triage_conditions={json.dumps(triage_conditions or {})} "
+                + f"situation_chars={len(msg or '')}"
+            )
+        # Condition and situation change per request; everything before them is reusable.
+        prompt, prefix_chars = _join_prompt_sections(prompt_sections, dynamic=2)
         cfg = {
             "t": safe_float(settings.get("tr_temp", 0.1), 0.1),
             "tk": safe_int(settings.get("tr_tok", 1024), 1024),
@@ -2307,6 +2786,9 @@ def build_prompt(settings, mode, msg, p_name, store, triage_selections=None, tri
             "k": safe_int(settings.get("tr_k", 50), 50),
             "rep_penalty": rep_penalty,
         }
+    if prefix_chars:
+        # Lets the runner reuse token ids for the static leading sections.
+        cfg["prefix_chars"] = prefix_chars
 
     return prompt, cfg, prompt_meta
 
@@ -2322,7 +2804,7 @@ def _safe_json_load(value):
         return value
     if isinstance(value, str):
         try:
-            return json.loads(value)
+            return _json_loads(value)
         except Exception:
             return None
     return None
@@ -2378,7 +2860,14 @@ def _format_transcript_for_prompt(messages, next_user_message):
 
 def get_credentials(store):
     """Return list of crew entries that have username/password set."""
-    return get_credentials_rows()
+    # require_auth runs this on every request; served from the db_op cache
+    # and dropped whenever patients are written.
+    cached = _db_cache_get("credentials")
+    if cached is not None:
+        return cached
+    rows = get_credentials_rows()
+    _db_cache_put("credentials", rows)
+    return rows
 
 
 def load_context(store):
@@ -2397,6 +2886,26 @@ def _has_creds(store):
     return bool(creds)
 
 
+async def _read_json(request: Request):
+    """Read the request body once and decode it with the fast JSON loader."""
+    return _json_loads(await request.body())
+
+
+async def _read_fields(request: Request):
+    """
+    Return chat-style request fields from a JSON body or form data.
+
+    JSON callers skip multipart/form parsing entirely; booleans are mapped to
+    the "true"/"false" strings the form handlers already compare against.
+    """
+    if request.headers.get("content-type", "").startswith("application/json"):
+        payload = await _read_json(request)
+        if isinstance(payload, dict):
+            return {k: ("true" if v is True else "false" if v is False else v) for k, v in payload.items()}
+        return {}
+    return await request.form()
+
+
 def require_auth(request: Request):
     """Enforce auth only when credentials are configured."""
     store = DEFAULT_store
@@ -2409,6 +2918,53 @@ def require_auth(request: Request):
     return True
 
 
+def _write_if_changed(dest: Path, payload: bytes) -> bool:
+    """Write `payload` to `dest` unless the file already holds identical bytes."""
+    try:
+        if dest.stat().st_size == len(payload) and dest.read_bytes() == payload:
+            return False
+    except OSError:
+        pass
+    with open(dest, "wb") as fh:
+        fh.write(payload)
+    return True
+
+
+def _export_default_dataset(store) -> list:
+    """Write the store's data and medicine uploads into DATA_ROOT/default; return the written file names."""
+    default_root = DATA_ROOT / "default"
+    default_root.mkdir(parents=True, exist_ok=True)
+    default_uploads = default_root / "uploads" / "medicines"
+    default_uploads.mkdir(parents=True, exist_ok=True)
+    categories = ["settings", "patients", "inventory", "tools", "history", "vessel", "chats", "context"]
+    written = []
+    for cat in categories:
+        data = db_op(cat, store=store)
+        dest = default_root / f"{cat}.json"
+        _write_if_changed(dest, _json_dumps_bytes(data, pretty=True))
+        written.append(dest.name)
+    triage_tree_dest = default_root / "triage_prompt_tree.json"
+    _write_if_changed(triage_tree_dest, _json_dumps_bytes(get_triage_prompt_tree(), pretty=True))
+    written.append(triage_tree_dest.name)
+    # Copy medicine uploads; _fast_clone keeps mtimes, so size+mtime
+    # matching means the file was already exported.
+    src_med = store["uploads"] / "medicines"
+    if src_med.exists():
+        for item in src_med.iterdir():
+            if not item.is_file():
+                continue
+            target = default_uploads / item.name
+            src_st = item.stat()
+            try:
+                dst_st = target.stat()
+                if dst_st.st_size == src_st.st_size and int(dst_st.st_mtime) == int(src_st.st_mtime):
+                    continue
+            except OSError:
+                pass
+            _fast_clone(item, target)
+    return written
+
+
 @app.post("/api/default/export")
 async def export_default_dataset(request: Request, _=Depends(require_auth)):
     """
@@ -2419,26 +2975,8 @@ async def export_default_dataset(request: Request, _=Depends(require_auth)):
         store = request.state.store
         if not store:
             return JSONResponse({"error": "store not set"}, status_code=status.HTTP_400_BAD_REQUEST)
-        default_root = DATA_ROOT / "default"
-        default_root.mkdir(parents=True, exist_ok=True)
-        default_uploads = default_root / "uploads" / "medicines"
-        default_uploads.mkdir(parents=True, exist_ok=True)
-        categories = ["settings", "patients", "inventory", "tools", "history", "vessel", "chats", "context"]
-        written = []
-        for cat in categories:
-            data = db_op(cat, store=store)
-            dest = default_root / f"{cat}.json"
-            dest.write_text(json.dumps(data, indent=4))
-            written.append(dest.name)
-        triage_tree_dest = default_root / "triage_prompt_tree.json"
-        triage_tree_dest.write_text(json.dumps(get_triage_prompt_tree(), indent=2, ensure_ascii=False), encoding="utf-8")
-        written.append(triage_tree_dest.name)
-        # Copy medicine uploads
-        src_med = store["uploads"] / "medicines"
-        if src_med.exists():
-            for item in src_med.iterdir():
-                if item.is_file():
-                    shutil.copy2(item, default_uploads / item.name)
+        # Serialization and file copies are blocking disk work; keep them off the event loop.
+        written = await asyncio.to_thread(_export_default_dataset, store)
         return {"status": "ok", "written": written}
     except Exception as e:
         return JSONResponse({"error": f"Unable to export default dataset: {e}"}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -2465,7 +3003,7 @@ async def login(request: Request):
     store = DEFAULT_store
     payload = {}
     if request.headers.get("content-type", "").startswith("application/json"):
-        payload = await request.json()
+        payload = await _read_json(request)
     else:
         form = await request.form()
         payload = dict(form)
@@ -2709,7 +3247,7 @@ async def triage_options_save(request: Request, _=Depends(require_auth)):
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
         if not isinstance(payload, dict):
             return JSONResponse({"error": "Payload must be an object"}, status_code=status.HTTP_400_BAD_REQUEST)
         set_triage_options(payload)
@@ -2745,12 +3283,11 @@ async def db_status():
         crew = vessel = 0
         if exists and size > 0:
             try:
-                with sqlite3.connect(DB_PATH) as conn:
-                    cur = conn.cursor()
-                    cur.execute("SELECT COUNT(*) FROM crew")
-                    crew = cur.fetchone()[0] or 0
-                    cur.execute("SELECT COUNT(*) FROM vessel")
-                    vessel = cur.fetchone()[0] or 0
+                # Reuse this thread's pooled connection instead of opening
+                # (and leaking) a fresh one on every health probe.
+                counts = get_status_counts()
+                crew = counts["crew"]
+                vessel = counts["vessel"]
             except Exception:
                 pass
         return {
@@ -2771,6 +3308,8 @@ async def db_seed():
     """Force reseed from bundled/remote seed DB."""
     try:
         _bootstrap_db(force=True)
+        configure_db(DB_PATH)
+        _apply_db_write_lock_setting()
         _store_dirs(DEFAULT_store_LABEL)
         return {"status": "seeded"}
     except Exception as e:
@@ -2783,7 +3322,7 @@ async def db_create():
     try:
         DB_PATH.parent.mkdir(parents=True, exist_ok=True)
         if DB_PATH.exists():
-            DB_PATH.unlink()
+            _remove_db_files(DB_PATH)
         configure_db(DB_PATH)
         _apply_db_write_lock_setting()
         _store_dirs(DEFAULT_store_LABEL)
@@ -2795,26 +3334,31 @@ async def db_create():
 @app.post("/api/db/upload")
 async def db_upload(file: UploadFile = File(...)):
     """Upload a SQLite DB to replace the current one."""
-    import tempfile
-
     try:
         DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        tmp = tempfile.NamedTemporaryFile(delete=False)
+        head = await file.read(100)
+        if not head.startswith(b"SQLite format 3"):
+            return JSONResponse({"error": "Invalid SQLite file"}, status_code=status.HTTP_400_BAD_REQUEST)
+        # Spool next to DB_PATH so the final swap is a same-filesystem rename
+        # rather than a cross-device copy out of /tmp.
+        incoming = DB_PATH.with_suffix(".incoming")
         try:
-            head = await file.read(100)
-            if not head.startswith(b"SQLite format 3"):
-                tmp.close()
-                Path(tmp.name).unlink(missing_ok=True)
-                return JSONResponse({"error": "Invalid SQLite file"}, status_code=status.HTTP_400_BAD_REQUEST)
-            tmp.write(head)
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                tmp.write(chunk)
+            with open(incoming, "wb") as fh:
+                fh.write(head)
+                while True:
+                    chunk = await file.read(4 * 1024 * 1024)
+                    if not chunk:
+                        break
+                    # Multi-MB disk writes would otherwise stall the event loop.
+                    await asyncio.to_thread(fh.write, chunk)
+            # Only the old WAL/SHM sidecars are removed; os.replace then swaps
+            # app.db atomically, so a failure leaves the live DB in place.
+            release_connections()
+            for sidecar in (Path(f"{DB_PATH}-wal"), Path(f"{DB_PATH}-shm")):
+                sidecar.unlink(missing_ok=True)
+            os.replace(incoming, DB_PATH)
         finally:
-            tmp.close()
-        shutil.move(tmp.name, DB_PATH)
+            incoming.unlink(missing_ok=True)
         configure_db(DB_PATH)
         _apply_db_write_lock_setting()
         _store_dirs(DEFAULT_store_LABEL)
@@ -2839,6 +3383,7 @@ async def delete_inventory_record(item_id: str, _=Depends(require_auth)):
     """Delete a single pharmaceutical without revalidating the entire inventory payload."""
     try:
         removed = delete_inventory_item(item_id)
+        _db_cache_invalidate("inventory")
         if not removed:
             return JSONResponse({"error": "Item not found"}, status_code=status.HTTP_404_NOT_FOUND)
         return {"status": "deleted", "id": item_id}
@@ -2851,9 +3396,10 @@ async def delete_inventory_record(item_id: str, _=Depends(require_auth)):
 async def verify_inventory_record(item_id: str, request: Request, _=Depends(require_auth)):
     """Toggle a single pharma item's verified flag without touching other records."""
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
         flag = bool(payload.get("verified"))
         ok = update_item_verified(item_id, flag)
+        _db_cache_invalidate("inventory")
         if not ok:
             return JSONResponse({"error": "Item not found"}, status_code=status.HTTP_404_NOT_FOUND)
         return {"id": item_id, "verified": flag}
@@ -2866,11 +3412,12 @@ async def verify_inventory_record(item_id: str, request: Request, _=Depends(requ
 async def upsert_single_inventory(item_id: str, request: Request, _=Depends(require_auth)):
     """Upsert a single pharma item and its expiries; avoids wiping the whole inventory."""
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
         if not isinstance(payload, dict):
             return JSONResponse({"error": "Payload must be an object"}, status_code=status.HTTP_400_BAD_REQUEST)
         payload["id"] = item_id  # ensure path id wins
         normalized = upsert_inventory_item(payload)
+        _db_cache_invalidate("inventory")
         return normalized
     except ValueError as e:
         return JSONResponse({"error": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
@@ -2886,7 +3433,7 @@ async def get_history_entry(entry_id: str, _=Depends(require_auth)):
         entry = get_history_entry_by_id(entry_id)
         if not entry:
             return JSONResponse({"error": "History entry not found"}, status_code=status.HTTP_404_NOT_FOUND)
-        return JSONResponse(entry)
+        return DEFAULT_RESPONSE_CLASS(entry)
     except Exception:
         logger.exception("history get failed", extra={"entry_id": entry_id, "db_path": str(DB_PATH)})
         return JSONResponse({"error": "Server error"}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -2896,7 +3443,7 @@ async def get_history_entry(entry_id: str, _=Depends(require_auth)):
 async def upsert_history_entry_api(entry_id: str, request: Request, _=Depends(require_auth)):
     """Update one consultation log entry without rewriting the full history list."""
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
         if not isinstance(payload, dict):
             return JSONResponse({"error": "Payload must be a JSON object."}, status_code=status.HTTP_400_BAD_REQUEST)
 
@@ -2912,7 +3459,7 @@ async def upsert_history_entry_api(entry_id: str, request: Request, _=Depends(re
 
         upsert_history_entry(merged)
         saved = get_history_entry_by_id(entry_id) or merged
-        return JSONResponse(saved)
+        return DEFAULT_RESPONSE_CLASS(saved)
     except ValueError as e:
         return JSONResponse({"error": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
     except Exception:
@@ -2939,13 +3486,21 @@ async def manage(cat: str, request: Request, _=Depends(require_auth)):
     try:
         if request.method == "POST":
             try:
-                payload = await request.json()
+                payload = await _read_json(request)
             except Exception:
                 form = await request.form()
                 payload = dict(form)
-            return JSONResponse(db_op(cat, payload))
+            return DEFAULT_RESPONSE_CLASS(db_op(cat, payload))
+        limit = request.query_params.get("limit")
+        if cat == "history" and limit is not None:
+            # Paged history reads go straight to the table (LIMIT/OFFSET); history is
+            # not in DB_CACHED_CATEGORIES, so unpaged reads hit the table too.
+            offset = request.query_params.get("offset") or 0
+            return DEFAULT_RESPONSE_CLASS(get_history_entries(limit=safe_int(limit, 0), offset=safe_int(offset, 0)))
         result = db_op(cat)
-        return JSONResponse(result)
+        # Crew and inventory payloads carry inline photo data URLs; encode
+        # them with orjson rather than the stdlib JSONResponse.
+        return DEFAULT_RESPONSE_CLASS(result)
     except ValueError as e:
         try:
             logger.warning("api/data validation error", extra={"cat": cat, "error": str(e), "db_path": str(DB_PATH)})
@@ -2979,7 +3534,7 @@ async def save_prompt_library(request: Request, _=Depends(require_auth)):
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
     except Exception:
         payload = {}
     if not isinstance(payload, dict):
@@ -3031,7 +3586,7 @@ async def save_triage_tree_settings(request: Request, _=Depends(require_auth)):
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
     except Exception:
         payload = {}
     if not isinstance(payload, dict):
@@ -3089,7 +3644,7 @@ async def save_triage_modules(request: Request, _=Depends(require_auth)):
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
     except Exception:
         payload = {}
     if not isinstance(payload, dict):
@@ -3121,16 +3676,20 @@ async def get_context(request: Request, _=Depends(require_auth)):
     return {}
 
 
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+").sub
+
+
 def _safe_filename_part(raw: str, fallback: str) -> str:
     """
      Safe Filename Part helper.
     Detailed inline notes are included to support safe maintenance and future edits.
     """
-    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", (raw or "").strip())
+    safe = _UNSAFE_FILENAME_CHARS("_", (raw or "").strip())
     safe = safe.strip("._-")
     return safe or fallback
 
 
+@lru_cache(maxsize=64)
 def _ext_for_mime(mime: str, default_ext: str = ".bin") -> str:
     """
      Ext For Mime helper.
@@ -3165,7 +3724,7 @@ def _decode_data_url_bytes(value: str):
         mime = meta.strip()
     try:
         if ";base64" in header.lower():
-            blob = base64.b64decode(payload)
+            blob = _b64decode(payload)
         else:
             blob = unquote_to_bytes(payload)
     except Exception:
@@ -3261,7 +3820,7 @@ async def update_vessel_photo(request: Request, _=Depends(require_auth)):
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
         field = payload.get("field")
         data = payload.get("data") or ""
         if field not in {"boatPhoto", "registrationFrontPhoto", "registrationBackPhoto"}:
@@ -3275,6 +3834,60 @@ async def update_vessel_photo(request: Request, _=Depends(require_auth)):
         return JSONResponse({"error": "Server error"}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _build_immigration_zip(patients: list, vessel: dict, export_date: str) -> bytes:
+    """Assemble the immigration export archive (CSV, vessel info, decoded images) in memory."""
+    zip_buffer = io.BytesIO()
+    passport_files = 0
+    vessel_image_files = 0
+    # Images are already compressed (JPEG/PNG), so they are stored rather than
+    # deflated; only the text members are compressed.
+    with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(
+            f"crew_list_{export_date}.csv",
+            _build_crew_list_csv_text(patients, vessel, export_date),
+        )
+        zf.writestr("vessel_info.txt", _build_vessel_info_text(vessel))
+
+        vessel_images = {
+            "boatPhoto": "boat_photo",
+            "registrationFrontPhoto": "registration_front",
+            "registrationBackPhoto": "registration_back",
+        }
+        for field, basename in vessel_images.items():
+            mime, blob = _decode_data_url_bytes(vessel.get(field) or "")
+            if not blob:
+                continue
+            ext = _ext_for_mime(mime, ".bin")
+            zf.writestr(f"vessel_images/{basename}{ext}", blob, compress_type=zipfile.ZIP_STORED)
+            vessel_image_files += 1
+
+        for idx, crew in enumerate(patients, start=1):
+            mime, blob = _decode_data_url_bytes(crew.get("passportPage") or "")
+            if not blob:
+                continue
+            name = _safe_filename_part(_crew_display_name(crew), f"crew_{idx:02d}")
+            ext = _ext_for_mime(mime, ".bin")
+            zf.writestr(f"passport_pages/{idx:02d}_{name}_passport_page{ext}", blob, compress_type=zipfile.ZIP_STORED)
+            passport_files += 1
+
+        manifest_lines = [
+            "IMMIGRATION EXPORT PACKAGE",
+            f"Generated (UTC): {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"Crew records: {len(patients)}",
+            f"Passport page files: {passport_files}",
+            f"Vessel image files: {vessel_image_files}",
+            "",
+            "Included files:",
+            f"- crew_list_{export_date}.csv",
+            "- vessel_info.txt",
+            "- passport_pages/*",
+            "- vessel_images/*",
+        ]
+        zf.writestr("manifest.txt", "\n".join(manifest_lines) + "\n")
+
+    return zip_buffer.getvalue()
+
+
 @app.get("/api/export/immigration-zip")
 async def export_immigration_zip(request: Request, _=Depends(require_auth)):
     """
@@ -3287,58 +3900,13 @@ async def export_immigration_zip(request: Request, _=Depends(require_auth)):
         export_date = datetime.utcnow().strftime("%Y-%m-%d")
         vessel_slug = _safe_filename_part(str(vessel.get("vesselName") or ""), "vessel")
         zip_name = f"immigration_export_{vessel_slug}_{export_date}.zip"
-        zip_buffer = io.BytesIO()
-        passport_files = 0
-        vessel_image_files = 0
-        with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            zf.writestr(
-                f"crew_list_{export_date}.csv",
-                _build_crew_list_csv_text(patients, vessel, export_date),
-            )
-            zf.writestr("vessel_info.txt", _build_vessel_info_text(vessel))
-
-            vessel_images = {
-                "boatPhoto": "boat_photo",
-                "registrationFrontPhoto": "registration_front",
-                "registrationBackPhoto": "registration_back",
-            }
-            for field, basename in vessel_images.items():
-                mime, blob = _decode_data_url_bytes(vessel.get(field) or "")
-                if not blob:
-                    continue
-                ext = _ext_for_mime(mime, ".bin")
-                zf.writestr(f"vessel_images/{basename}{ext}", blob)
-                vessel_image_files += 1
-
-            for idx, crew in enumerate(patients, start=1):
-                mime, blob = _decode_data_url_bytes(crew.get("passportPage") or "")
-                if not blob:
-                    continue
-                name = _safe_filename_part(_crew_display_name(crew), f"crew_{idx:02d}")
-                ext = _ext_for_mime(mime, ".bin")
-                zf.writestr(f"passport_pages/{idx:02d}_{name}_passport_page{ext}", blob)
-                passport_files += 1
-
-            manifest_lines = [
-                "IMMIGRATION EXPORT PACKAGE",
-                f"Generated (UTC): {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}",
-                f"Crew records: {len(patients)}",
-                f"Passport page files: {passport_files}",
-                f"Vessel image files: {vessel_image_files}",
-                "",
-                "Included files:",
-                f"- crew_list_{export_date}.csv",
-                "- vessel_info.txt",
-                "- passport_pages/*",
-                "- vessel_images/*",
-            ]
-            zf.writestr("manifest.txt", "\n".join(manifest_lines) + "\n")
-
-        zip_buffer.seek(0)
+        # Base64-decoding every passport page and zipping them is CPU-bound;
+        # keep it off the event loop.
+        zip_bytes = await asyncio.to_thread(_build_immigration_zip, patients, vessel, export_date)
         headers = {
             "Content-Disposition": f"attachment; filename=\"{zip_name}\"; filename*=UTF-8''{quote(zip_name)}"
         }
-        return Response(content=zip_buffer.getvalue(), media_type="application/zip", headers=headers)
+        return Response(content=zip_bytes, media_type="application/zip", headers=headers)
     except Exception:
         logger.exception("immigration zip export failed")
         return JSONResponse({"error": "Server error"}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -3351,7 +3919,7 @@ async def update_crew_photo(request: Request, _=Depends(require_auth)):
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
         crew_id = str(payload.get("id") or "").strip()
         field = payload.get("field")
         data = payload.get("data") or ""
@@ -3359,7 +3927,9 @@ async def update_crew_photo(request: Request, _=Depends(require_auth)):
             return JSONResponse({"error": "Invalid field"}, status_code=status.HTTP_400_BAD_REQUEST)
         if not crew_id:
             return JSONResponse({"error": "Missing id"}, status_code=status.HTTP_400_BAD_REQUEST)
-        ok = update_patient_fields(crew_id, {field: data})
+        # db_store base64-decodes the data URL; do that on a worker thread.
+        ok = await asyncio.to_thread(update_patient_fields, crew_id, {field: data})
+        _db_cache_invalidate("patients")
         if not ok:
             return JSONResponse({"error": "Update failed"}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
         return {"status": "ok"}
@@ -3372,13 +3942,14 @@ async def update_crew_photo(request: Request, _=Depends(require_auth)):
 async def update_crew_credentials(request: Request, _=Depends(require_auth)):
     """Update plaintext crew credentials (per owner request)."""
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
         crew_id = str(payload.get("id") or "").strip()
         username = payload.get("username")
         password = payload.get("password")
         if not crew_id:
             return JSONResponse({"error": "Missing id"}, status_code=status.HTTP_400_BAD_REQUEST)
         ok = update_patient_fields(crew_id, {"username": username, "password": password})
+        _db_cache_invalidate("patients")
         if not ok:
             return JSONResponse({"error": "Update failed"}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
         return {"status": "ok"}
@@ -3394,12 +3965,13 @@ async def upsert_crew_vaccine(request: Request, _=Depends(require_auth)):
     Detailed inline notes are included to support safe maintenance and future edits.
     """
     try:
-        payload = await request.json()
+        payload = await _read_json(request)
         crew_id = str(payload.get("crew_id") or "").strip()
         if not crew_id:
             return JSONResponse({"error": "Missing crew_id"}, status_code=status.HTTP_400_BAD_REQUEST)
         vaccine = payload.get("vaccine") or {}
         rec = upsert_vaccine(crew_id, vaccine)
+        _db_cache_invalidate("patients")
         return {"vaccine": rec}
     except Exception:
         logger.exception("crew vaccine upsert failed")
@@ -3414,6 +3986,7 @@ async def delete_crew_vaccine(crew_id: str, vaccine_id: str, _=Depends(require_a
     """
     try:
         ok = delete_vaccine(crew_id, vaccine_id)
+        _db_cache_invalidate("patients")
         if not ok:
             return JSONResponse({"error": "Not found"}, status_code=status.HTTP_404_NOT_FOUND)
         return {"status": "ok"}
@@ -3493,15 +4066,10 @@ def _generate_response_local(model_choice: str, force_cpu_slow: bool, prompt: st
     model_name = (model_choice or "google/medgemma-1.5-4b-it").strip()
     model_name_l = model_name.lower()
     is_large_model = "27b" in model_name_l or "28b" in model_name_l
-    force_cuda = os.environ.get("FORCE_CUDA", "").strip() == "1"
-    allow_cpu_fallback_on_cuda_error = os.environ.get("ALLOW_CPU_FALLBACK_ON_CUDA_ERROR", "").strip() == "1"
-    runtime_device = "cuda" if torch.cuda.is_available() else "cpu"
+    force_cuda = FORCE_CUDA
+    allow_cpu_fallback_on_cuda_error = ALLOW_CPU_FALLBACK_ON_CUDA_ERROR
+    runtime_device, cuda_err = _local_runtime_device()
     if force_cuda and runtime_device != "cuda":
-        cuda_err = ""
-        try:
-            torch.cuda.current_device()
-        except Exception as exc:
-            cuda_err = str(exc)
         detail = f": {cuda_err}" if cuda_err else ""
         raise RuntimeError(f"CUDA_NOT_AVAILABLE{detail}")
     if is_large_model and runtime_device != "cuda" and not force_cpu_slow:
@@ -3517,27 +4085,18 @@ def _generate_response_local(model_choice: str, force_cpu_slow: bool, prompt: st
     )
     try:
         if is_large_model:
-            # Ensure only one model family occupies VRAM at a time.
-            try:
-                medgemma4.unload_model()
-            except Exception:
-                pass
-            max_mem_gpu = os.environ.get("MODEL_MAX_GPU_MEM_27B") or os.environ.get("MODEL_MAX_GPU_MEM") or "8GiB"
-            max_mem_cpu = os.environ.get("MODEL_MAX_CPU_MEM", "64GiB")
-            max_memory = {0: max_mem_gpu, "cpu": max_mem_cpu} if runtime_device == "cuda" else None
-            device_map_27b = os.environ.get("MODEL_DEVICE_MAP_27B", "manual").strip() or "manual"
-            res = medgemma27b.generate(
+            # The runner dispatch unloads the other family so only one occupies VRAM.
+            max_memory = {0: MODEL_MAX_GPU_MEM_27B, "cpu": MODEL_MAX_CPU_MEM} if runtime_device == "cuda" else None
+            res = _runner_generate(
+                "27b",
                 prompt,
                 cfg,
-                device_map=device_map_27b if runtime_device == "cuda" else "cpu",
+                device_map=MODEL_DEVICE_MAP_27B if runtime_device == "cuda" else "cpu",
                 max_memory=max_memory,
             )
         else:
-            try:
-                medgemma27b.unload_model()
-            except Exception:
-                pass
-            res = medgemma4.generate(
+            res = _runner_generate(
+                "4b",
                 prompt,
                 cfg,
                 device_map="cuda:0" if runtime_device == "cuda" else "cpu",
@@ -3571,7 +4130,7 @@ def _generate_response_local(model_choice: str, force_cpu_slow: bool, prompt: st
 
         _dbg(f"generate_response: cuda runtime failure detected: {err_txt}")
         try:
-            torch.cuda.empty_cache()
+            _release_inference_memory()
         except Exception:
             pass
 
@@ -3585,25 +4144,21 @@ def _generate_response_local(model_choice: str, force_cpu_slow: bool, prompt: st
                 # Preserve existing UX: ask user to confirm slow CPU run for 27B.
                 raise RuntimeError("SLOW_28B_CPU")
             _dbg("generate_response: retrying 27B on CPU after CUDA failure")
-            try:
-                medgemma27b.unload_model()
-            except Exception:
-                pass
-            res = medgemma27b.generate(
+            res = _runner_generate(
+                "27b",
                 prompt,
                 cfg,
+                reload=True,
                 device_map="cpu",
                 max_memory=None,
             )
         else:
             _dbg("generate_response: retrying 4B on CPU after CUDA failure")
-            try:
-                medgemma4.unload_model()
-            except Exception:
-                pass
-            res = medgemma4.generate(
+            res = _runner_generate(
+                "4b",
                 prompt,
                 cfg,
+                reload=True,
                 device_map="cpu",
             )
     models["active_name"] = model_name
@@ -3620,6 +4175,41 @@ def _generate_response_local(model_choice: str, force_cpu_slow: bool, prompt: st
     return res
 
 
+@lru_cache(maxsize=1)
+def _hf_inference_client(token: str, timeout: float):
+    """Return a shared InferenceClient so remote chats reuse its HTTP session; a new token builds a new one."""
+    from huggingface_hub import InferenceClient
+
+    return InferenceClient(token=token, timeout=timeout)
+
+
+def _response_memo_key(model_choice: str, force_cpu_slow: bool, prompt: str, cfg: dict):
+    """Return a memo key for a deterministic local generation, or None when it must not be cached."""
+    if not RESPONSE_MEMO_SIZE or safe_float(cfg.get("t"), 0.0) > 0:
+        return None
+    cfg_key = json.dumps(cfg, sort_keys=True, default=str)
+    raw = f"{model_choice}|{bool(force_cpu_slow)}|{cfg_key}|{prompt}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _response_memo_get(key: str):
+    """Return a memoized (model_name, response) pair and mark it most recently used."""
+    with _RESPONSE_MEMO_LOCK:
+        hit = _RESPONSE_MEMO.get(key)
+        if hit is not None:
+            _RESPONSE_MEMO.move_to_end(key)
+        return hit
+
+
+def _response_memo_put(key: str, model_name: str, out: str):
+    """Memoize a response, evicting the least recently used entries past RESPONSE_MEMO_SIZE."""
+    with _RESPONSE_MEMO_LOCK:
+        _RESPONSE_MEMO[key] = (model_name, out)
+        _RESPONSE_MEMO.move_to_end(key)
+        while len(_RESPONSE_MEMO) > RESPONSE_MEMO_SIZE:
+            _RESPONSE_MEMO.popitem(last=False)
+
+
 def _generate_response(
     model_choice: str,
     force_cpu_slow: bool,
@@ -3628,10 +4218,13 @@ def _generate_response(
     prelocked: bool = False,
     trace_id: str = "",
     remote_mode: bool = False,
+    reply_meta: dict = None,
 ):
     """
      Generate Response helper.
     Detailed inline notes are included to support safe maintenance and future edits.
+    `reply_meta`, when given, is filled with the answering model and whether the
+    reply came from the response memo.
     """
     _dbg(
         "generate_response: "
@@ -3650,7 +4243,7 @@ def _generate_response(
                 model_choice=model_choice,
             )
             raise RuntimeError("REMOTE_TOKEN_MISSING")
-        client = InferenceClient(token=HF_REMOTE_TOKEN, timeout=HF_REMOTE_TIMEOUT_SECONDS)
+        client = _hf_inference_client(HF_REMOTE_TOKEN, HF_REMOTE_TIMEOUT_SECONDS)
         # Use requested model when provided (e.g., MedGemma) else default
         model_name = model_choice or REMOTE_MODEL
         _dbg(f"generate_response: remote inference model={model_name}")
@@ -3838,10 +4431,30 @@ def _generate_response(
         _dbg(f"generate_response: remote response_len={len(out)}")
         return out
 
+    # Greedy decoding is deterministic for a given model/prompt/cfg, so repeat
+    # requests (e.g. identical triage intakes) can skip inference entirely.
+    memo_key = _response_memo_key(model_choice, force_cpu_slow, prompt, cfg)
+    if memo_key:
+        memo_hit = _response_memo_get(memo_key)
+        if memo_hit is not None:
+            memo_model, memo_out = memo_hit
+            _runtime_log("inference.local.memo_hit", trace_id=trace_id, model=memo_model)
+            # Leave models["active_name"] alone: it tracks what is loaded, not who answered.
+            if reply_meta is not None:
+                reply_meta.update({"model": memo_model, "memo_hit": True})
+            return memo_out
     if prelocked:
-        return _generate_response_local(model_choice, force_cpu_slow, prompt, cfg, trace_id=trace_id)
-    with MODEL_MUTEX:
-        return _generate_response_local(model_choice, force_cpu_slow, prompt, cfg, trace_id=trace_id)
+        out = _generate_response_local(model_choice, force_cpu_slow, prompt, cfg, trace_id=trace_id)
+        answered_by = models["active_name"]
+    else:
+        with MODEL_MUTEX:
+            out = _generate_response_local(model_choice, force_cpu_slow, prompt, cfg, trace_id=trace_id)
+            answered_by = models["active_name"]
+    if reply_meta is not None:
+        reply_meta.update({"model": answered_by, "memo_hit": False})
+    if memo_key and out:
+        _response_memo_put(memo_key, answered_by, out)
+    return out
 
 
 @app.post("/api/chat")
@@ -3852,7 +4465,12 @@ async def chat(request: Request, _=Depends(require_auth)):
         store = request.state.store
         start_time = datetime.now()
         trace_id = uuid.uuid4().hex[:12]
-        form = await request.form()
+        try:
+            form = await _read_fields(request)
+        except ValueError as e:
+            # A malformed client body is a 400, not a server fault; skip the traceback.
+            _runtime_log("chat.request.invalid", level=logging.WARNING, trace_id=trace_id, reason="malformed_body", error=str(e))
+            return JSONResponse({"error": "Malformed request body."}, status_code=status.HTTP_400_BAD_REQUEST)
         msg = (form.get("message") or "").strip()
         if not msg:
             _runtime_log("chat.request.invalid", level=logging.WARNING, trace_id=trace_id, reason="empty_message")
@@ -3982,6 +4600,7 @@ async def chat(request: Request, _=Depends(require_auth)):
         )
         if override_prompt.strip():
             prompt = override_prompt.strip()
+            cfg.pop("prefix_chars", None)
 
         _runtime_log(
             "chat.prompt.ready",
@@ -4002,6 +4621,7 @@ async def chat(request: Request, _=Depends(require_auth)):
         # Persist the exact prompt submitted for debug visibility in Settings.
         try:
             set_settings_meta(last_prompt_verbatim=prompt)
+            _db_cache_invalidate("settings")
         except Exception:
             logger.exception("Unable to persist last_prompt_verbatim")
             _runtime_log(
@@ -4011,7 +4631,6 @@ async def chat(request: Request, _=Depends(require_auth)):
                 error="Unable to persist last_prompt_verbatim",
             )
 
-        model_lock_acquired = False
         busy_meta_set = False
         queue_ticket = None
         queue_wait_seconds = 0
@@ -4095,18 +4714,20 @@ async def chat(request: Request, _=Depends(require_auth)):
                 request_remote_inference=request_remote_inference,
                 force_cpu_slow=force_cpu_slow,
             )
+            reply_meta = {}
             if not request_remote_inference:
-                MODEL_MUTEX.acquire()
-                model_lock_acquired = True
-                res = await asyncio.to_thread(
+                # _generate_response takes MODEL_MUTEX on the worker thread, so a
+                # model preload in progress no longer blocks the event loop.
+                res = await _run_on_model_worker(
                     _generate_response,
                     model_choice,
                     force_cpu_slow,
                     prompt,
                     cfg,
-                    True,
+                    False,
                     trace_id,
                     False,
+                    reply_meta,
                 )
             else:
                 res = await asyncio.to_thread(
@@ -4118,6 +4739,7 @@ async def chat(request: Request, _=Depends(require_auth)):
                     False,
                     trace_id,
                     True,
+                    reply_meta,
                 )
             _runtime_log(
                 "chat.inference.success",
@@ -4180,11 +4802,6 @@ async def chat(request: Request, _=Depends(require_auth)):
                 )
             return JSONResponse({"error": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
         finally:
-            if model_lock_acquired:
-                try:
-                    MODEL_MUTEX.release()
-                except RuntimeError:
-                    pass
             if busy_meta_set:
                 _clear_model_busy_meta()
             if queue_ticket is not None:
@@ -4192,9 +4809,14 @@ async def chat(request: Request, _=Depends(require_auth)):
                     _chat_queue_release(queue_ticket)
                 except Exception:
                     pass
-        elapsed_ms = max(int((datetime.now() - start_time).total_seconds() * 1000), 0)
-
-        now_iso = datetime.now().isoformat()
+        # One clock read serves the latency figure and every timestamp below.
+        end_time = datetime.now()
+        elapsed_ms = max(int((end_time - start_time).total_seconds() * 1000), 0)
+        # A memo hit never touches models["active_name"], so attribute the reply
+        # to the model that originally produced it.
+        reply_model = reply_meta.get("model") or models["active_name"]
+
+        now_iso = end_time.isoformat()
         patient_display = (
             lookup_patient_display_name(p_name, store, default="Unnamed Crew")
             if mode == "triage"
@@ -4202,7 +4824,7 @@ async def chat(request: Request, _=Depends(require_auth)):
         )
         session_date = session_meta.get("date") or session_meta.get("started_at")
         if not session_date:
-            session_date = datetime.now().strftime("%Y-%m-%d %H:%M")
+            session_date = end_time.strftime("%Y-%m-%d %H:%M")
         if is_start:
             transcript_messages = []
         user_entry = {
@@ -4218,7 +4840,7 @@ async def chat(request: Request, _=Depends(require_auth)):
             {
                 "role": "assistant",
                 "message": res,
-                "model": models["active_name"],
+                "model": reply_model,
                 "ts": now_iso,
                 "duration_ms": elapsed_ms,
             }
@@ -4227,7 +4849,7 @@ async def chat(request: Request, _=Depends(require_auth)):
         if not is_priv:
             existing_entry = get_history_entry_by_id(session_id) if not is_start else None
             if not session_date:
-                session_date = (existing_entry or {}).get("date") or datetime.now().strftime("%Y-%m-%d %H:%M")
+                session_date = (existing_entry or {}).get("date") or end_time.strftime("%Y-%m-%d %H:%M")
             query_text = session_meta.get("initial_query") or (existing_entry or {}).get("query") or user_msg_raw
             patient_id = session_meta.get("patient_id") or p_name or (existing_entry or {}).get("patient_id") or ""
             meta_payload = dict(session_meta_payload)
@@ -4252,30 +4874,32 @@ async def chat(request: Request, _=Depends(require_auth)):
                 "mode": mode,
                 "query": query_text,
                 "user_query": query_text,
-                "response": json.dumps(transcript_payload),
-                "model": models["active_name"],
+                "response": _json_dumps_bytes(transcript_payload).decode("utf-8"),
+                "model": reply_model,
                 "duration_ms": elapsed_ms,
                 "prompt": prompt,
                 "injected_prompt": override_prompt.strip() or prompt,
             }
             upsert_history_entry(entry)
 
-        metrics = _update_chat_metrics(store, models["active_name"])
+        metrics = _update_chat_metrics(
+            store, reply_model, elapsed_ms, record=not reply_meta.get("memo_hit")
+        )
         _runtime_log(
             "chat.response.ready",
             trace_id=trace_id,
             mode=mode,
-            model=models["active_name"],
+            model=reply_model,
             duration_ms=elapsed_ms,
             queue_wait_seconds=queue_wait_seconds,
             session_id=session_id,
             private=is_priv,
         )
 
-        return JSONResponse(
+        return DEFAULT_RESPONSE_CLASS(
             {
                 "response": res,
-                "model": models["active_name"],
+                "model": reply_model,
                 "duration_ms": elapsed_ms,
                 "queue_wait_seconds": queue_wait_seconds,
                 "queue_ticket": queue_ticket,
@@ -4314,7 +4938,10 @@ async def chat_preview(request: Request, _=Depends(require_auth)):
     Chat Preview helper.
     Detailed inline notes are included to support safe maintenance and future edits.
     """
-    form = await request.form()
+    try:
+        form = await _read_fields(request)
+    except ValueError:
+        return JSONResponse({"error": "Malformed request body."}, status_code=status.HTTP_400_BAD_REQUEST)
     msg = form.get("message")
     p_name = form.get("patient")
     mode = form.get("mode")
@@ -4342,6 +4969,16 @@ async def chat_preview(request: Request, _=Depends(require_auth)):
     }
 
 
+def _snapshot_present(model_id: str) -> bool:
+    """Cheap startup probe: does the HF cache hold at least one snapshot entry for this model?"""
+    snap_dir = CACHE_DIR / "hub" / f"models--{model_id.replace('/', '--')}" / "snapshots"
+    try:
+        with os.scandir(snap_dir) as entries:
+            return next(entries, None) is not None
+    except OSError:
+        return False
+
+
 def has_model_cache(model_name: str):
     """
     Has Model Cache helper.
@@ -4351,6 +4988,15 @@ def has_model_cache(model_name: str):
     return ok
 
 
+def _snapshot_fingerprint(snap_dir: Path):
+    """Return (name, mtime_ns) for each snapshot dir; changes whenever files land in one."""
+    try:
+        with os.scandir(snap_dir) as entries:
+            return tuple(sorted((e.name, e.stat().st_mtime_ns) for e in entries))
+    except OSError:
+        return None
+
+
 def model_cache_status(model_name: str):
     """Lightweight check: is the huggingface snapshot for this model present locally?"""
     safe = model_name.replace("/", "--")
@@ -4359,8 +5005,17 @@ def model_cache_status(model_name: str):
     if not base.exists():
         return False, "cache directory missing"
     snap_dir = base / "snapshots"
-    if not snap_dir.exists():
+    fingerprint = _snapshot_fingerprint(snap_dir)
+    if fingerprint is None:
         return False, "snapshots directory missing"
+    # The full scan loads each snapshot's config; reuse it until a snapshot
+    # directory is added, removed or modified.
+    return _scan_model_snapshots(snap_dir, fingerprint)
+
+
+@lru_cache(maxsize=64)
+def _scan_model_snapshots(snap_dir: Path, fingerprint):
+    """Validate cached snapshots (config + weights loadable); memoized on the dir fingerprint."""
     last_err = "config/weights missing in cache"
     for child in snap_dir.iterdir():
         if not child.is_dir():
@@ -4369,6 +5024,8 @@ def model_cache_status(model_name: str):
         weights_present = any(child.glob("model-*.safetensors")) or (child / "model.safetensors").exists() or (child / "model.safetensors.index.json").exists()
         if cfg.exists() and weights_present:
             try:
+                from transformers import AutoConfig
+
                 AutoConfig.from_pretrained(child, local_files_only=True)
             except Exception as e:
                 last_err = f"config load failed: {e}"
@@ -4415,8 +5072,23 @@ def _resolve_hf_token() -> Optional[str]:
     return None
 
 
+# HF downloads are long blocking I/O; keep them off the default executor and
+# never let two threads (UI + background verify) pull the same repo at once.
+DOWNLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hf-dl")
+_DOWNLOAD_LOCKS = {}
+_DOWNLOAD_LOCKS_GUARD = threading.Lock()
+
+
 def download_model_cache(model_name: str):
     """Attempt to download a model snapshot into the shared cache."""
+    with _DOWNLOAD_LOCKS_GUARD:
+        lock = _DOWNLOAD_LOCKS.setdefault(model_name, threading.Lock())
+    with lock:
+        return _download_model_cache(model_name)
+
+
+def _download_model_cache(model_name: str):
+    """Run snapshot_download for one model; callers hold its download lock."""
     try:
         safe = model_name.replace("/", "--")
         base = CACHE_DIR / "hub" / f"models--{safe}"
@@ -4443,6 +5115,8 @@ def download_model_cache(model_name: str):
             "chat_template*",
             "README*",
         ]
+        from huggingface_hub import snapshot_download
+
         snapshot_download(
             repo_id=model_name,
             cache_dir=str(CACHE_DIR / "hub"),
@@ -4470,18 +5144,19 @@ def _resolve_local_model_dir(model_name: str):
     return resolved
 
 
-def verify_required_models(download_missing: bool = False, force_download: bool = False):
+def verify_required_models(download_missing: bool = False, force_download: bool = False, model_ids=None):
     """Check required model cache; optionally download missing models when online.
 
     Notes:
     - ``download_missing`` enables fetch attempts for missing models.
     - ``force_download`` lets an explicit UI action (Readiness -> Download missing)
       override AUTO_DOWNLOAD_MODELS so local deployments can fetch on demand.
+    - ``model_ids`` restricts the check to a subset (defaults to REQUIRED_MODELS).
     """
     results = []
     offline = is_offline_mode()
     download_allowed = (AUTO_DOWNLOAD_MODELS or force_download) and not offline
-    for m in REQUIRED_MODELS:
+    for m in (REQUIRED_MODELS if model_ids is None else model_ids):
         cached, cache_err = model_cache_status(m)
         downloaded = False
         error = ""
@@ -4498,8 +5173,9 @@ def verify_required_models(download_missing: bool = False, force_download: bool
 def _offline_status_payload(model_status, *, download_requested: bool = False, force_download: bool = False):
     """Return a consistent payload for all Offline Readiness endpoints."""
     usage = shutil.disk_usage(CACHE_DIR)
+    cache_dir = str(CACHE_DIR.resolve())
     disk = {
-        "path": str(CACHE_DIR.resolve()),
+        "path": cache_dir,
         "free_gb": round(usage.free / (1024**3), 2),
         "total_gb": round(usage.total / (1024**3), 2),
     }
@@ -4511,7 +5187,7 @@ def _offline_status_payload(model_status, *, download_requested: bool = False, f
         "AUTO_DOWNLOAD_MODELS": str(AUTO_DOWNLOAD_MODELS),
     }
     missing = [m for m in model_status if not m.get("cached")]
-    cached_count = len([m for m in model_status if m.get("cached")])
+    cached_count = len(model_status) - len(missing)
     offline_mode = is_offline_mode()
     download_allowed = bool((AUTO_DOWNLOAD_MODELS or force_download) and not offline_mode)
     return {
@@ -4520,7 +5196,7 @@ def _offline_status_payload(model_status, *, download_requested: bool = False, f
         "cached_models": cached_count,
         "total_models": len(model_status),
         "env": env_flags,
-        "cache_dir": str(CACHE_DIR.resolve()),
+        "cache_dir": cache_dir,
         "offline_mode": offline_mode,
         "disk": disk,
         "download_requested": bool(download_requested),
@@ -4529,16 +5205,48 @@ def _offline_status_payload(model_status, *, download_requested: bool = False, f
     }
 
 
+try:
+    OFFLINE_STATUS_TTL_SECONDS = float(os.environ.get("OFFLINE_STATUS_TTL_SECONDS", "2"))
+except Exception:
+    OFFLINE_STATUS_TTL_SECONDS = 2.0
+# (monotonic time, payload) for the last read-only offline status; the lock
+# makes concurrent UI polls share one cache walk instead of each doing it.
+_OFFLINE_STATUS_CACHE = [0.0, None]
+_OFFLINE_STATUS_LOCK = asyncio.Lock()
+
+
+def _offline_status_invalidate() -> None:
+    """Drop the cached offline status after flags change or models download."""
+    _OFFLINE_STATUS_CACHE[:] = [0.0, None]
+
+
+async def _cached_offline_status():
+    """Return the read-only offline status payload, recomputing at most once per TTL."""
+    async with _OFFLINE_STATUS_LOCK:
+        stamp, payload = _OFFLINE_STATUS_CACHE
+        if payload is not None and (time.monotonic() - stamp) <= OFFLINE_STATUS_TTL_SECONDS:
+            return payload
+        model_status = verify_required_models(download_missing=False)
+        payload = _offline_status_payload(model_status, download_requested=False, force_download=False)
+        _OFFLINE_STATUS_CACHE[:] = [time.monotonic(), payload]
+        return payload
+
+
 @app.get("/api/offline/check")
 async def offline_check(_=Depends(require_auth)):
     """Report cache status/disk usage without downloading models."""
     try:
-        model_status = verify_required_models(download_missing=False)
-        return _offline_status_payload(model_status, download_requested=False, force_download=False)
+        return await _cached_offline_status()
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# Recognised boolean spellings; exact-match hits skip the strip/lower copy.
+_BOOL_STRINGS = MappingProxyType(
+    {"1": True, "true": True, "yes": True, "on": True, "0": False, "false": False, "no": False, "off": False}
+)
+
+
 def _parse_bool(val):
     """
      Parse Bool helper.
@@ -4551,42 +5259,182 @@ def _parse_bool(val):
     if isinstance(val, (int, float)):
         return bool(val)
     if isinstance(val, str):
-        lowered = val.strip().lower()
-        if lowered in {"1", "true", "yes", "on"}:
-            return True
-        if lowered in {"0", "false", "no", "off"}:
-            return False
+        hit = _BOOL_STRINGS.get(val)
+        if hit is not None:
+            return hit
+        return _BOOL_STRINGS.get(val.strip().lower())
     return None
 
 
+# Model weights and media are effectively incompressible; DEFLATE on them burns
+# CPU for no size win, so they go into backups stored as-is.
+_ZIP_STORED_SUFFIXES = frozenset(
+    {".safetensors", ".bin", ".pt", ".onnx", ".gguf", ".zip", ".gz", ".zst", ".png", ".jpg", ".jpeg", ".webp"}
+)
+# HF cache blobs carry no suffix; anything this large is a weight shard.
+_ZIP_STORED_MIN_BYTES = 64 * 1024 * 1024
+# How many small compressible files may be read ahead of the zip writer, and
+# the cap on their combined size. Only files under _BACKUP_READ_AHEAD_MAX_FILE
+# are read whole; larger compressible files stream through zf.open instead.
+_BACKUP_READ_AHEAD = 16
+_BACKUP_READ_AHEAD_BYTES = 16 * 1024 * 1024
+_BACKUP_READ_AHEAD_MAX_FILE = 1024 * 1024
+# Zstandard ZIP entries (method 93) need Python 3.14+ zipfile on both the
+# writing and restoring side; older runtimes simply never offer it.
+_ZIP_ZSTANDARD = getattr(zipfile, "ZIP_ZSTANDARD", None)
+# (method, level) used for the compressible JSON/text entries.
+_ZIP_TEXT_CODECS = {"deflate": (zipfile.ZIP_DEFLATED, 1)}
+if _ZIP_ZSTANDARD is not None:
+    _ZIP_TEXT_CODECS["zstd"] = (_ZIP_ZSTANDARD, 3)
+
+
+def _zip_compression_for(path: str, size: int) -> int:
+    """Pick ZIP_STORED for binary/already-compressed files and ZIP_DEFLATED for the rest."""
+    if size >= _ZIP_STORED_MIN_BYTES or os.path.splitext(path)[1].lower() in _ZIP_STORED_SUFFIXES:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _iter_files(root: str):
+    """Yield paths of regular files (and links to them) under `root`, without descending into linked dirs."""
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+                except OSError:
+                    continue
+
+
+def _read_file_bytes(path: str) -> bytes:
+    """Return the full contents of `path`."""
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def _zip_add_files(zf: zipfile.ZipFile, items, codec: str = "deflate") -> None:
+    """
+    Add (path, arcname) pairs to `zf` with per-file compression.
+
+    Stored entries and compressible files of _BACKUP_READ_AHEAD_MAX_FILE or
+    more stream straight from disk as forced ZIP64 entries. Smaller files are
+    dominated by open/read latency, so a thread pool reads them ahead (bounded
+    by count and by _BACKUP_READ_AHEAD_BYTES) while this thread compresses and
+    appends; zipfile itself still writes one entry at a time. `codec` picks the
+    method for the compressed entries from _ZIP_TEXT_CODECS.
+    """
+    text_method, text_level = _ZIP_TEXT_CODECS[codec]
+    pending = deque()
+    pending_bytes = 0
+    workers = min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backup-read") as pool:
+        for path, arcname in items:
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            if _zip_compression_for(path, zinfo.file_size) == zipfile.ZIP_STORED:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                # Level 1 DEFLATE (ratio close to level 6) or zstd level 3 for the JSON/text remainder.
+                zinfo.compress_type = text_method
+                zinfo._compresslevel = text_level
+            if zinfo.compress_type == zipfile.ZIP_STORED or zinfo.file_size >= _BACKUP_READ_AHEAD_MAX_FILE:
+                # Always ZIP64: zipfile never has to size-check or rewrite the local header.
+                with open(path, "rb") as src, zf.open(zinfo, "w", force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, length=1 << 20)
+                continue
+            pending.append((zinfo, pool.submit(_read_file_bytes, path)))
+            pending_bytes += zinfo.file_size
+            while len(pending) > _BACKUP_READ_AHEAD or pending_bytes > _BACKUP_READ_AHEAD_BYTES:
+                done_info, done = pending.popleft()
+                pending_bytes -= done_info.file_size
+                zf.writestr(done_info, done.result())
+        while pending:
+            done_info, done = pending.popleft()
+            zf.writestr(done_info, done.result())
+
+
+def _backup_manifest_entries(items) -> dict:
+    """Map each arcname to [size, mtime_ns] for change detection between backups."""
+    entries = {}
+    for path, arcname in items:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries[arcname] = [st.st_size, st.st_mtime_ns]
+    return entries
+
+
+def _write_offline_backup(store, codec: str):
+    """
+    Zip the store's data, uploads and the model cache into a new backup.
+
+    Returns (path, reused). A sidecar .manifest.json records the size and
+    mtime of every file in the last backup; when nothing changed since, that
+    archive is returned instead of re-reading gigabytes of weights.
+    """
+    base_str = str(APP_HOME.resolve()) + os.sep
+    roots = [
+        (store["data"], "data"),
+        (store["uploads"], "uploads"),
+        (CACHE_DIR, "models_cache"),
+    ]
+    items = []
+    for root, root_label in roots:
+        root_str = str(root.resolve())
+        # Arcnames are plain string slices: relative to APP_HOME when the root
+        # lives under it, else under the root's label so structure is preserved.
+        if (root_str + os.sep).startswith(base_str):
+            prefix, cut = "", len(base_str)
+        else:
+            prefix, cut = root_label + os.sep, len(root_str) + 1
+        items.extend((path, prefix + path[cut:]) for path in _iter_files(root_str))
+    entries = _backup_manifest_entries(items)
+    manifest_path = store["backup"] / ".manifest.json"
+    try:
+        previous = _json_loads(manifest_path.read_bytes())
+    except Exception:
+        previous = {}
+    if isinstance(previous, dict) and previous.get("codec") == codec and previous.get("entries") == entries:
+        prev_backup = store["backup"] / str(previous.get("backup") or "")
+        if previous.get("backup") and prev_backup.is_file():
+            return prev_backup, True
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    dest = store["backup"] / f"offline_backup_{ts}.zip"
+    # Two backups in the same second must not overwrite each other. The
+    # zero-padded "_NNN" sorts after the plain name and in numeric order, so
+    # _latest_backup's name comparison keeps picking the newest.
+    attempt = 1
+    while dest.exists():
+        dest = store["backup"] / f"offline_backup_{ts}_{attempt:03d}.zip"
+        attempt += 1
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        _zip_add_files(zf, items, codec=codec)
+    try:
+        manifest_path.write_bytes(_json_dumps_bytes({"backup": dest.name, "codec": codec, "entries": entries}))
+    except OSError:
+        pass
+    return dest, False
+
+
 @app.post("/api/offline/backup")
 async def offline_backup(request: Request, _=Depends(require_auth)):
     """Zip the model cache so it can be carried onboard or restored later."""
     try:
         store = request.state.store
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        dest = store["backup"] / f"offline_backup_{ts}.zip"
-        base = APP_HOME.resolve()
-        roots = [
-            (store["data"], "data"),
-            (store["uploads"], "uploads"),
-            (CACHE_DIR, "models_cache"),
-        ]
-        with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for root, root_label in roots:
-                for path in root.rglob("*"):
-                    if path.is_file():
-                        try:
-                            arcname = path.resolve().relative_to(base)
-                        except Exception:
-                            # Preserve folder structure even when storage lives outside APP_HOME.
-                            try:
-                                rel = path.resolve().relative_to(root.resolve())
-                                arcname = Path(root_label) / rel
-                            except Exception:
-                                arcname = Path(root_label) / path.name
-                        zf.write(path, arcname=str(arcname))
-        return {"backup": str(dest.resolve())}
+        # ?zstd=1 opts into Zstandard text entries where this Python supports them.
+        codec = "zstd" if _parse_bool(request.query_params.get("zstd")) and "zstd" in _ZIP_TEXT_CODECS else "deflate"
+        # Multi-GB archive work runs on a worker thread so the event loop keeps serving polls.
+        dest, reused = await asyncio.to_thread(_write_offline_backup, store, codec)
+        return {"backup": str(dest.resolve()), "unchanged": reused}
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -4597,7 +5445,7 @@ async def offline_flags(request: Request, _=Depends(require_auth)):
     try:
         payload = {}
         try:
-            payload = await request.json()
+            payload = await _read_json(request)
         except Exception:
             payload = {}
         raw_enable = payload.get("enable", None)
@@ -4616,12 +5464,60 @@ async def offline_flags(request: Request, _=Depends(require_auth)):
             db_op("settings", existing, store=request.state.store)
         except Exception:
             pass
-        model_status = verify_required_models(download_missing=False)
-        return _offline_status_payload(model_status, download_requested=False, force_download=False)
+        # Flags feed the payload (offline_mode, env), so never serve a pre-toggle copy.
+        _offline_status_invalidate()
+        return await _cached_offline_status()
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _latest_backup(backup_dir: Path) -> Optional[Path]:
+    """Return the newest offline_backup_*.zip by name in one scandir pass, or None."""
+    best = None
+    try:
+        with os.scandir(backup_dir) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith("offline_backup_") and name.endswith(".zip") and (best is None or name > best):
+                    if entry.is_file():
+                        best = name
+    except OSError:
+        return None
+    return backup_dir / best if best else None
+
+
+def _extract_offline_backup(target: Path) -> Optional[str]:
+    """Extract a backup into APP_HOME; return an error message instead if any entry escapes it."""
+    # Safety: ensure extraction stays inside APP_HOME and never writes
+    # outside the application directory tree.
+    app_root = APP_HOME.resolve()
+    # Compare against root + separator so a sibling like "<root>2/" can't pass.
+    root_prefix = str(app_root) + os.sep
+    with zipfile.ZipFile(target, "r") as zf:
+        plan = []
+        for member in zf.infolist():
+            member_name = (member.filename or "").strip()
+            if not member_name:
+                continue
+            destination = (app_root / member_name).resolve()
+            if not str(destination).startswith(root_prefix):
+                return f"Unsafe path in backup archive: {member_name}"
+            plan.append((member, destination))
+        # Every entry is validated before the first write; then stream each
+        # one out in 1 MiB chunks rather than extractall's 8 KiB copies.
+        for member, destination in plan:
+            if member.is_dir():
+                destination.mkdir(parents=True, exist_ok=True)
+                continue
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            # Unlink first so a hardlinked file (see _fast_clone) gets a new
+            # inode instead of rewriting the other link's content too.
+            destination.unlink(missing_ok=True)
+            with zf.open(member) as src, open(destination, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=1 << 20)
+    return None
+
+
 @app.post("/api/offline/restore")
 async def offline_restore(request: Request, _=Depends(require_auth)):
     """Restore the latest offline backup (or a specified one) into the app root."""
@@ -4629,36 +5525,25 @@ async def offline_restore(request: Request, _=Depends(require_auth)):
         store = request.state.store
         payload = {}
         try:
-            payload = await request.json()
+            payload = await _read_json(request)
         except Exception:
             payload = {}
         filename = (payload.get("filename") or "").strip()
         backup_dir = store["backup"]
-        candidates = sorted(backup_dir.glob("offline_backup_*.zip"))
         target = None
         if filename:
             candidate = backup_dir / filename
             if candidate.exists() and candidate.is_file():
                 target = candidate
-        elif candidates:
-            target = candidates[-1]
+        else:
+            target = _latest_backup(backup_dir)
         if not target:
             return JSONResponse({"error": "No backup found to restore"}, status_code=status.HTTP_400_BAD_REQUEST)
-        # Safety: ensure extraction stays inside APP_HOME and never writes
-        # outside the application directory tree.
-        app_root = APP_HOME.resolve()
-        with zipfile.ZipFile(target, "r") as zf:
-            for member in zf.infolist():
-                member_name = (member.filename or "").strip()
-                if not member_name:
-                    continue
-                destination = (app_root / member_name).resolve()
-                if not str(destination).startswith(str(app_root)):
-                    return JSONResponse(
-                        {"error": f"Unsafe path in backup archive: {member_name}"},
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                    )
-            zf.extractall(app_root)
+        unsafe = await asyncio.to_thread(_extract_offline_backup, target)
+        if unsafe:
+            return JSONResponse({"error": unsafe}, status_code=status.HTTP_400_BAD_REQUEST)
+        # Restored model snapshots change what the offline status reports.
+        _offline_status_invalidate()
         return {"restored": str(target.resolve())}
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -4670,7 +5555,12 @@ async def offline_ensure(_=Depends(require_auth)):
     try:
         # force_download=True intentionally overrides AUTO_DOWNLOAD_MODELS for
         # explicit operator-initiated readiness actions in Settings.
-        results = verify_required_models(download_missing=True, force_download=True)
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            DOWNLOAD_EXECUTOR,
+            lambda: verify_required_models(download_missing=True, force_download=True),
+        )
+        _offline_status_invalidate()
         return _offline_status_payload(results, download_requested=True, force_download=True)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -4678,7 +5568,6 @@ async def offline_ensure(_=Depends(require_auth)):
 
 hb_models = _heartbeat("Housekeeping", interval=2.0)
 _startup_model_check()
-_background_verify_models()
 hb_models.set()
 
 if __name__ == "__main__":
@@ -4693,37 +5582,46 @@ if __name__ == "__main__":
     print("=" * 50)
 
     uvicorn.run("app:app", host="0.0.0.0", port=5000, reload=False)
+def _remove_entry(path: str, is_dir: bool) -> None:
+    """Delete one directory entry, ignoring failures like the old per-path loop did."""
+    try:
+        if is_dir:
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+    except Exception:
+        pass
+
+
+def _clear_dir(root: Path) -> None:
+    """Empty `root`, overlapping the unlink/rmtree syscalls on a small thread pool."""
+    try:
+        with os.scandir(root) as it:
+            targets = [(entry.path, entry.is_dir(follow_symlinks=False)) for entry in it]
+    except OSError:
+        return
+    if not targets:
+        return
+    with ThreadPoolExecutor(max_workers=min(8, len(targets)), thread_name_prefix="store-clear") as pool:
+        for path, is_dir in targets:
+            pool.submit(_remove_entry, path, is_dir)
+
+
 def _clear_store_data(store):
     """Remove data and uploads for a store to start fresh."""
     if not store:
         return
-    # Clear data directory
-    for path in store["data"].iterdir():
-        try:
-            if path.is_file() or path.is_symlink():
-                path.unlink()
-            elif path.is_dir():
-                shutil.rmtree(path)
-        except Exception:
-            continue
-    # Clear uploads
-    for path in store["uploads"].iterdir():
-        try:
-            if path.is_file() or path.is_symlink():
-                path.unlink()
-            elif path.is_dir():
-                shutil.rmtree(path)
-        except Exception:
-            continue
-    # Recreate expected files with defaults
-    db_op("settings", get_defaults(), store=store)
-    db_op("patients", [], store=store)
-    db_op("inventory", [], store=store)
-    db_op("tools", [], store=store)
-    db_op("history", [], store=store)
-    db_op("vessel", {}, store=store)
-    db_op("chats", [], store=store)
-    db_op("context", {}, store=store)
+    _clear_dir(store["data"])
+    _clear_dir(store["uploads"])
+    # Reset every table to defaults in one SQLite transaction (single commit).
+    with transaction():
+        db_op("settings", get_defaults(), store=store)
+        db_op("patients", [], store=store)
+        db_op("inventory", [], store=store)
+        db_op("tools", [], store=store)
+        db_op("history", [], store=store)
+        db_op("vessel", {}, store=store)
+        db_op("chats", [], store=store)
 
 
 def _apply_default_dataset(store):
@@ -4740,7 +5638,8 @@ def _apply_default_dataset(store):
         src = default_root / f"{name}.json"
         dest = store["data"] / f"{name}.json"
         if src.exists():
-            dest.write_text(src.read_text())
+            # Byte copy (sendfile on Linux); no decode/encode round trip.
+            shutil.copyfile(src, dest)
     # Copy uploads (medicines)
     src_med = default_uploads / "medicines"
     dest_med = store["uploads"] / "medicines"
@@ -4748,7 +5647,7 @@ def _apply_default_dataset(store):
         dest_med.mkdir(parents=True, exist_ok=True)
         for item in src_med.iterdir():
             if item.is_file():
-                shutil.copy2(item, dest_med / item.name)
+                _fast_clone(item, dest_med / item.name)
 
 
 #
@@ -18,26 +18,103 @@ import shutil
 import sqlite3
 import logging
 import re
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Any, Dict
 
+try:
+    # Optional: SIMD base64 for passport/photo data URLs; same API as stdlib.
+    import pybase64 as _b64
+except ImportError:
+    import base64 as _b64
+
+try:
+    # Optional: faster JSON for chat meta, context and triage-tree payloads.
+    import orjson
+except ImportError:
+    orjson = None
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _json_dumps(obj) -> str:
+    """Serialize `obj` to a JSON string for a TEXT column, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
 logger = logging.getLogger("uvicorn.error")
 
 DB_PATH: Path
 DB_WRITE_LOCK = False
 TRIAGE_TREE_DEFAULT_JSON_PATH = Path(__file__).resolve().parent / "seed" / "triage_prompt_tree.default.json"
+WAL_CHECKPOINT_INTERVAL_SECONDS = 60
+_CHECKPOINT_THREAD: Optional[threading.Thread] = None
+# One long-lived connection per thread; bumped generation forces a reopen.
+_THREAD_CONN = threading.local()
+_CONN_GENERATION = 0
+_OPEN_CONNS = []  # (owner thread, connection) pairs
+_OPEN_CONNS_LOCK = threading.Lock()
 
 
 def configure_db(path: Path):
     """Configure DB path and ensure single-workspace schema."""
-    global DB_PATH
+    global DB_PATH, _CONN_GENERATION
     DB_PATH = path.resolve()
+    _CONN_GENERATION += 1
     path.parent.mkdir(parents=True, exist_ok=True)
+    _enable_wal()
     _init_db()
     # Run any needed schema upgrades (non-destructive)
     _upgrade_schema()
+    _start_wal_checkpointer()
+
+
+def _enable_wal():
+    """Switch the database to WAL journaling (persistent across reopen)."""
+    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    try:
+        conn.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "PRAGMA synchronous=NORMAL;"
+            "PRAGMA temp_store=MEMORY;"
+            "PRAGMA mmap_size=268435456;"
+            "PRAGMA cache_size=-64000;"
+            "PRAGMA wal_autocheckpoint=1000;"
+        )
+    except Exception:
+        logger.exception("Unable to enable WAL journaling for %s", DB_PATH)
+    finally:
+        conn.close()
+
+
+def _wal_checkpoint_loop():
+    """Truncate the WAL periodically so auto-checkpoints never stall a commit."""
+    while True:
+        time.sleep(WAL_CHECKPOINT_INTERVAL_SECONDS)
+        try:
+            conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+            try:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+            finally:
+                conn.close()
+        except Exception:
+            logger.debug("WAL checkpoint skipped", exc_info=True)
+
+
+def _start_wal_checkpointer():
+    """Start the background WAL checkpoint thread once per process."""
+    global _CHECKPOINT_THREAD
+    if _CHECKPOINT_THREAD is not None and _CHECKPOINT_THREAD.is_alive():
+        return
+    _CHECKPOINT_THREAD = threading.Thread(
+        target=_wal_checkpoint_loop, name="sqlite-wal-checkpoint", daemon=True
+    )
+    _CHECKPOINT_THREAD.start()
 
 
 def set_db_write_lock(enabled: bool):
@@ -51,26 +128,149 @@ def get_db_write_lock() -> bool:
     return bool(DB_WRITE_LOCK)
 
 
-def _conn():
-    """
-     Conn helper.
-    Detailed inline notes are included to support safe maintenance and future edits.
-    """
+def _open_conn():
+    """Open and tune a new SQLite connection for the configured DB path."""
     conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
     conn.row_factory = sqlite3.Row
     try:
         conn.execute("PRAGMA foreign_keys = ON;")
         # Keep temp tables in memory to avoid filesystem issues when sorting large BLOB rows
         conn.execute("PRAGMA temp_store = MEMORY;")
-        if DB_WRITE_LOCK:
-            conn.execute("PRAGMA query_only = ON;")
-        else:
-            conn.execute("PRAGMA query_only = OFF;")
+        # Per-connection tuning; journal_mode=WAL is persisted by configure_db.
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute("PRAGMA cache_size = -64000;")
+        conn.execute("PRAGMA mmap_size = 268435456;")
     except Exception:
         pass
     return conn
 
 
+def _conn():
+    """
+    Return this thread's shared connection, opening it on first use.
+
+    Reusing the connection keeps SQLite's page cache warm across calls and
+    avoids re-running connection PRAGMAs. Callers keep using
+    `with _conn() as conn:` which commits/rolls back but never closes.
+    """
+    tx = getattr(_THREAD_CONN, "tx", None)
+    if tx is not None:
+        return tx
+    key = (_CONN_GENERATION, str(DB_PATH))
+    conn = getattr(_THREAD_CONN, "conn", None)
+    if conn is None or getattr(_THREAD_CONN, "key", None) != key:
+        stale = [conn] if conn is not None else []
+        conn = _open_conn()
+        with _OPEN_CONNS_LOCK:
+            # Drop our previous connection plus any left behind by exited threads.
+            keep = []
+            for owner, other in _OPEN_CONNS:
+                if other in stale or not owner.is_alive():
+                    stale.append(other)
+                else:
+                    keep.append((owner, other))
+            keep.append((threading.current_thread(), conn))
+            _OPEN_CONNS[:] = keep
+        for other in stale:
+            try:
+                other.close()
+            except Exception:
+                pass
+        _THREAD_CONN.conn = conn
+        _THREAD_CONN.key = key
+        _THREAD_CONN.query_only = None
+    write_lock = bool(DB_WRITE_LOCK)
+    if _THREAD_CONN.query_only != write_lock:
+        try:
+            conn.execute("PRAGMA query_only = ON;" if write_lock else "PRAGMA query_only = OFF;")
+            _THREAD_CONN.query_only = write_lock
+        except Exception:
+            pass
+    return conn
+
+
+class _TxConn:
+    """
+    Connection view handed out inside transaction().
+
+    Nested `with`/commit(), explicit BEGIN statements and rollback() are
+    no-ops, so helpers that manage their own transaction join the outer one;
+    an exception they re-raise still rolls back the whole group.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def commit(self):
+        return None
+
+    def rollback(self):
+        return None
+
+    def execute(self, sql, *args):
+        if sql.lstrip()[:5].upper() == "BEGIN":
+            return None
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@contextmanager
+def transaction():
+    """
+    Group several db_store writes into one SQLite transaction (single commit).
+
+    Helpers called inside keep their usual `with _conn() as conn:` bodies;
+    their commits are deferred until the outermost block exits and any
+    exception rolls back the whole group.
+    """
+    tx = getattr(_THREAD_CONN, "tx", None)
+    if tx is not None:
+        yield tx
+        return
+    conn = _conn()
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE;")
+    tx = _TxConn(conn)
+    _THREAD_CONN.tx = tx
+    try:
+        yield tx
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        _THREAD_CONN.tx = None
+
+
+def release_connections():
+    """
+    Close every pooled per-thread connection.
+
+    Call before the DB file is deleted or replaced so no thread keeps writing
+    to (or later checkpoints a WAL into) the old file. Threads reopen lazily.
+    """
+    global _CONN_GENERATION
+    with _OPEN_CONNS_LOCK:
+        conns = list(_OPEN_CONNS)
+        _OPEN_CONNS.clear()
+        _CONN_GENERATION += 1
+    for _owner, conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
 def _init_db():
     """Create single-workspace documents table; migrate legacy workspace schema if found."""
     with _conn() as conn:
@@ -810,7 +1010,7 @@ def _insert_chats(conn, chats: list, now: str):
                 "patient_id": c.get("patient_id"),
                 "user": c.get("user"),
                 "created_at": created,
-                "meta": json.dumps(meta_extra) if meta_extra else None,
+                "meta": _json_dumps(meta_extra) if meta_extra else None,
             },
         )
     conn.commit()
@@ -1627,7 +1827,7 @@ def _normalize_triage_prompt_tree_payload(payload: Any) -> Dict[str, Any]:
     data = payload
     if isinstance(payload, str):
         try:
-            data = json.loads(payload)
+            data = _json_loads(payload)
         except Exception as exc:
             raise ValueError("Invalid JSON payload for triage tree.") from exc
     if not isinstance(data, dict):
@@ -1643,7 +1843,7 @@ def _normalize_triage_prompt_tree_payload(payload: Any) -> Dict[str, Any]:
         "tree": tree,
     }
     try:
-        cleaned = json.loads(json.dumps(normalized, ensure_ascii=False))
+        cleaned = _json_loads(_json_dumps(normalized))
     except Exception as exc:
         raise ValueError("Triage tree payload must be JSON-serializable.") from exc
     _strip_legacy_exclusions(cleaned.get("tree"))
@@ -2583,13 +2783,12 @@ def get_patients() -> list:
     for r in crew_rows:
         rec = {k: r[k] for k in r.keys()}
         # reconstruct data URLs from blobs if present
-        import base64
         if r["passportHeadshotBlob"]:
             mime = r["passportHeadshotMime"] or "application/octet-stream"
-            rec["passportHeadshot"] = f"data:{mime};base64," + base64.b64encode(r["passportHeadshotBlob"]).decode("utf-8")
+            rec["passportHeadshot"] = f"data:{mime};base64," + _b64.b64encode(r["passportHeadshotBlob"]).decode("ascii")
         if r["passportPageBlob"]:
             mime = r["passportPageMime"] or "application/octet-stream"
-            rec["passportPage"] = f"data:{mime};base64," + base64.b64encode(r["passportPageBlob"]).decode("utf-8")
+            rec["passportPage"] = f"data:{mime};base64," + _b64.b64encode(r["passportPageBlob"]).decode("ascii")
         # Do not return raw blobs in the API payload; keep only data URLs
         rec.pop("passportHeadshotBlob", None)
         rec.pop("passportPageBlob", None)
@@ -2624,6 +2823,15 @@ def get_patient_options() -> list:
     ]
 
 
+def get_status_counts() -> Dict[str, int]:
+    """Return crew/vessel row counts for the DB health check in one round-trip."""
+    with _conn() as conn:
+        row = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM crew), (SELECT COUNT(*) FROM vessel)"
+        ).fetchone()
+    return {"crew": row[0] or 0, "vessel": row[1] or 0}
+
+
 def get_credentials_rows():
     """Return minimal credential info for auth (username + hashed password)."""
     with _conn() as conn:
@@ -3435,6 +3643,31 @@ def set_tool_items(items: list):
         conn.commit()
 
 
+# items columns copied straight from the inventory/tool payload.
+_ITEM_VALUE_FIELDS = (
+    "name", "genericName", "brandName", "alsoKnownAs", "formStrength",
+    "indications", "contraindications", "consultDoctor", "adultDosage", "pediatricDosage",
+    "unwantedEffects", "storageLocation", "subLocation", "status", "expiryDate",
+    "lastInspection", "batteryType", "batteryStatus", "calibrationDue", "totalQty",
+    "minPar", "supplier", "parentId", "category", "priorityTier", "tierCategory", "notes",
+)
+# items columns stored as 0/1 from truthy payload values.
+_ITEM_FLAG_FIELDS = ("verified", "requiresPower", "excludeFromResources")
+
+
+def _item_params(item: dict, item_type: str, updated_at: str) -> dict:
+    """Build the named-parameter mapping for an items row from a payload dict."""
+    get = item.get
+    params = {field: get(field) for field in _ITEM_VALUE_FIELDS}
+    for field in _ITEM_FLAG_FIELDS:
+        params[field] = 1 if get(field) else 0
+    params["id"] = str(get("id") or f"item-{datetime.utcnow().timestamp()}")
+    params["itemType"] = item_type
+    params["typeDetail"] = get("type")
+    params["updated_at"] = updated_at
+    return params
+
+
 def _insert_item(conn, item: dict, item_type: str, updated_at: str):
     """
      Insert Item helper.
@@ -3492,60 +3725,28 @@ def _insert_item(conn, item: dict, item_type: str, updated_at: str):
             excludeFromResources=excluded.excludeFromResources,
             updated_at=excluded.updated_at;
         """,
-        {
-            "id": str(item.get("id") or f"item-{datetime.utcnow().timestamp()}"),
-            "itemType": item_type,
-            "name": item.get("name"),
-            "genericName": item.get("genericName"),
-            "brandName": item.get("brandName"),
-            "alsoKnownAs": item.get("alsoKnownAs"),
-            "formStrength": item.get("formStrength"),
-            "indications": item.get("indications"),
-            "contraindications": item.get("contraindications"),
-            "consultDoctor": item.get("consultDoctor"),
-            "adultDosage": item.get("adultDosage"),
-            "pediatricDosage": item.get("pediatricDosage"),
-            "unwantedEffects": item.get("unwantedEffects"),
-            "storageLocation": item.get("storageLocation"),
-            "subLocation": item.get("subLocation"),
-            "status": item.get("status"),
-            "verified": 1 if item.get("verified") else 0,
-            "expiryDate": item.get("expiryDate"),
-            "lastInspection": item.get("lastInspection"),
-            "batteryType": item.get("batteryType"),
-            "batteryStatus": item.get("batteryStatus"),
-            "calibrationDue": item.get("calibrationDue"),
-            "totalQty": item.get("totalQty"),
-            "minPar": item.get("minPar"),
-            "supplier": item.get("supplier"),
-            "parentId": item.get("parentId"),
-            "requiresPower": 1 if item.get("requiresPower") else 0,
-            "category": item.get("category"),
-            "typeDetail": item.get("type"),
-            "priorityTier": item.get("priorityTier"),
-            "tierCategory": item.get("tierCategory"),
-            "notes": item.get("notes"),
-            "excludeFromResources": 1 if item.get("excludeFromResources") else 0,
-            "updated_at": updated_at,
-        },
+        _item_params(item, item_type, updated_at),
     )
     return True
 
 
-def get_history_entries():
+def get_history_entries(limit: Optional[int] = None, offset: int = 0):
     """
     Get History Entries helper.
-    Detailed inline notes are included to support safe maintenance and future edits.
+    Newest first; `limit`/`offset` page through the table instead of loading every entry.
     """
-    with _conn() as conn:
-        rows = conn.execute(
-            """
+    sql = """
             SELECT id, date, patient, patient_id, mode, query, user_query, response,
                    model, duration_ms, prompt, injected_prompt, updated_at
             FROM history_entries
             ORDER BY datetime(date) DESC
             """
-        ).fetchall()
+    params = ()
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params = (max(int(limit), 0), max(int(offset or 0), 0))
+    with _conn() as conn:
+        rows = conn.execute(sql, params).fetchall()
     return [{k: r[k] for k in r.keys()} for r in rows]
 
 
@@ -3754,7 +3955,7 @@ def get_chats():
         rec = dict(r)
         try:
             if rec.get("meta"):
-                rec.update(json.loads(rec["meta"]))
+                rec.update(_json_loads(rec["meta"]))
         except Exception:
             pass
         rec.pop("meta", None)
@@ -3795,6 +3996,35 @@ def set_chat_metrics(metrics: dict):
         _replace_chat_metrics(conn, metrics or {}, now)
 
 
+def bump_chat_metric(model: str, duration_ms) -> dict:
+    """Fold one chat duration into the running chat_metrics row for `model`."""
+    try:
+        duration = float(duration_ms or 0)
+    except (TypeError, ValueError):
+        duration = 0.0
+    now = datetime.utcnow().isoformat()
+    with _conn() as conn:
+        conn.execute(
+            """
+            INSERT INTO chat_metrics(model, count, total_ms, avg_ms, updated_at)
+            VALUES(:model, 1, :duration, :duration, :updated_at)
+            ON CONFLICT(model) DO UPDATE SET
+                count=count + 1,
+                total_ms=total_ms + excluded.total_ms,
+                avg_ms=(total_ms + excluded.total_ms) * 1.0 / (count + 1),
+                updated_at=excluded.updated_at;
+            """,
+            {"model": model, "duration": duration, "updated_at": now},
+        )
+        row = conn.execute(
+            "SELECT count, total_ms, avg_ms FROM chat_metrics WHERE model = ?",
+            (model,),
+        ).fetchone()
+    if not row:
+        return {"count": 0, "total_ms": 0, "avg_ms": 0}
+    return {"count": row["count"], "total_ms": row["total_ms"], "avg_ms": row["avg_ms"]}
+
+
 def get_settings_meta():
     """
     Get Settings Meta helper.
@@ -3877,7 +4107,7 @@ def get_context_payload():
     if not row:
         return {}
     try:
-        return json.loads(row["payload"] or "{}")
+        return _json_loads(row["payload"] or "{}")
     except Exception:
         return {}
 
@@ -3895,7 +4125,7 @@ def set_context_payload(payload: dict):
             VALUES(1, :payload, :updated_at)
             ON CONFLICT(id) DO UPDATE SET payload=excluded.payload, updated_at=excluded.updated_at;
             """,
-            {"payload": json.dumps(payload or {}), "updated_at": now},
+            {"payload": _json_dumps(payload or {}), "updated_at": now},
         )
         conn.commit()
 
@@ -3913,7 +4143,7 @@ def get_triage_prompt_tree() -> Dict[str, Any]:
     if not row:
         return _default_triage_prompt_tree()
     try:
-        parsed = json.loads(row["payload"] or "{}")
+        parsed = _json_loads(row["payload"] or "{}")
         normalized = _normalize_triage_prompt_tree_payload(parsed)
         return normalized
     except Exception:
@@ -3936,7 +4166,7 @@ def set_triage_prompt_tree(payload: Dict[str, Any]) -> Dict[str, Any]:
             ON CONFLICT(id) DO UPDATE SET payload=excluded.payload, updated_at=excluded.updated_at
             """,
             {
-                "payload": json.dumps(normalized, ensure_ascii=False),
+                "payload": _json_dumps(normalized),
                 "updated_at": now,
             },
         )
@@ -4228,7 +4458,6 @@ def set_triage_options(options: dict):
 
 def _decode_data_url(data_url: str):
     """Return (mime, bytes) from a data URL; fallback to octet-stream."""
-    import base64
     if not data_url or not isinstance(data_url, str) or not data_url.startswith("data:"):
         return None, b""
     try:
@@ -4236,7 +4465,7 @@ def _decode_data_url(data_url: str):
         mime = "application/octet-stream"
         if ";" in header:
             mime = header[5:].split(";")[0] or mime
-        blob = base64.b64decode(b64)
+        blob = _b64.b64decode(b64)
         return mime, blob
     except Exception:
         return None, b""
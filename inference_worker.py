@@ -0,0 +1,96 @@
+# =============================================================================
+# Author: Rick Escher
+# Project: SailingMedAdvisor
+# Context: Google HAI-DEF Framework
+# Models: Google MedGemmas
+# Program: Kaggle Impact Challenge
+# =============================================================================
+"""
+MedGemma runner dispatch, usable in-process or from a dedicated child process.
+
+Design intent:
+- Give app.py one entry point for both model families so "unload the other
+  family first" lives in a single place.
+- Keep this module free of app.py imports so a spawned child process can
+  load it (and the runners) without starting the web application.
+- When LOCAL_INFERENCE_PROCESS=1, app.py runs `generate` in one long-lived
+  child: tokenization and decode then hold that process's GIL and memory
+  rather than the API server's, and the model stays loaded between requests.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Tuple
+
+import os
+
+
+def init_worker() -> None:
+    """Apply one-time torch runtime setup inside the inference child process."""
+    import torch
+
+    from medgemma_common import configure_sdp_backends, patch_gemma3_mask_for_torch
+
+    # The child owns the host's cores for intra-op parallelism.
+    torch.set_num_threads(os.cpu_count() or 1)
+    patch_gemma3_mask_for_torch()
+    configure_sdp_backends()
+    if torch.cuda.is_available():
+        torch.backends.cuda.matmul.allow_tf32 = True
+
+
+def _runners(family: str):
+    """Return (active, other) runner modules for a model family."""
+    import medgemma4
+    import medgemma27b
+
+    if family == "27b":
+        return medgemma27b, medgemma4
+    return medgemma4, medgemma27b
+
+
+def generate(family: str, prompt: str, cfg: Dict[str, Any], kwargs: Dict[str, Any], reload: bool = False) -> str:
+    """
+    Generate one response with the 4B or 27B runner.
+
+    Only one model family occupies memory at a time, so the other runner is
+    unloaded first; `reload=True` also drops the active runner's model, used
+    when retrying on a different device after a CUDA failure.
+    """
+    active, other = _runners(family)
+    try:
+        other.unload_model()
+    except Exception:
+        pass
+    if reload:
+        try:
+            active.unload_model()
+        except Exception:
+            pass
+    return active.generate(prompt, cfg, **kwargs)
+
+
+def device_status() -> Tuple[str, str]:
+    """Return ("cuda" or "cpu", CUDA error detail) as seen by this process."""
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda", ""
+    try:
+        torch.cuda.current_device()
+    except Exception as exc:
+        return "cpu", str(exc)
+    return "cpu", ""
+
+
+def unload() -> None:
+    """Release both runners' models and flush this process's CUDA allocator."""
+    for runner in _runners(""):
+        try:
+            runner.unload_model()
+        except Exception:
+            pass
+    import torch
+
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
@@ -10,7 +10,8 @@ MedGemma 27B inference runner.
 
 Design intent:
 - Use 4-bit quantization to fit 27B inference on constrained edge hardware.
-- Support automatic and manual layer placement across GPU/CPU.
+- Support automatic and manual layer placement across GPU/CPU, or a
+  GPU-only NF4 load with no CPU offload.
 - Reuse loaded model when snapshot/load signature is unchanged to reduce
   repeated load latency and VRAM fragmentation.
 """
@@ -26,12 +27,21 @@ import torch
 from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
 
 from medgemma_common import (
+    bf16_supported,
+    build_static_cache,
     cap_new_tokens,
+    compile_for_decode,
+    default_dtype,
+    device_map_all_cuda,
+    encode_chat_prompt,
     normalize_device_map,
+    pick_attn_implementation,
     pick_input_device,
+    release_cuda_cache,
     resolve_model_max_length,
     resolve_snapshot,
     safe_pad_token_id,
+    static_cache_kwargs,
 )
 
 MODEL_ID = "google/medgemma-27b-text-it"
@@ -39,33 +49,28 @@ MODEL_ID = "google/medgemma-27b-text-it"
 _MODEL = None
 _TOKENIZER = None
 _ACTIVE_SNAPSHOT = None
+_KV_CACHE = None
 _ACTIVE_LOAD_SIGNATURE = None
 
 
-def _default_dtype() -> torch.dtype:
-    """Select default compute dtype with BF16 preference when available."""
-    if os.environ.get("FORCE_FP16", "").strip() == "1":
-        return torch.float16
-    if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
-        return torch.bfloat16
-    if torch.cuda.is_available():
-        return torch.float16
-    return torch.float32
-
+def _load_quant_config(cpu_offload: bool = True) -> Any:
+    """
+    Build BitsAndBytes 4-bit configuration for 27B local inference.
 
-def _load_quant_config() -> Any:
-    """Build BitsAndBytes 4-bit configuration for 27B local inference."""
+    fp32 CPU offload is only enabled when the device map puts layers on CPU;
+    a GPU-only map keeps every layer in NF4 and fails loudly if it can't fit.
+    """
     try:
         from transformers import BitsAndBytesConfig
     except Exception as exc:
         raise RuntimeError(f"bitsandbytes not available for 4-bit load: {exc}")
-    bnb_compute_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    bnb_compute_dtype = torch.bfloat16 if bf16_supported() else torch.float16
     return BitsAndBytesConfig(
         load_in_4bit=True,
         bnb_4bit_compute_dtype=bnb_compute_dtype,
         bnb_4bit_use_double_quant=True,
         bnb_4bit_quant_type="nf4",
-        llm_int8_enable_fp32_cpu_offload=True,
+        llm_int8_enable_fp32_cpu_offload=cpu_offload,
     )
 
 
@@ -145,9 +150,9 @@ def load_model(
     - Dtype changed
     - Max-memory map changed
     """
-    global _MODEL, _TOKENIZER, _ACTIVE_SNAPSHOT, _ACTIVE_LOAD_SIGNATURE
+    global _MODEL, _TOKENIZER, _KV_CACHE, _ACTIVE_SNAPSHOT, _ACTIVE_LOAD_SIGNATURE
     if dtype is None:
-        dtype = _default_dtype()
+        dtype = default_dtype()
     resolved = resolve_snapshot(MODEL_ID, snapshot)
     normalized_device_map = _resolve_device_map_for_27b(
         device_map,
@@ -166,24 +171,32 @@ def load_model(
     if _MODEL is not None or _TOKENIZER is not None:
         unload_model()
 
-    quant_config = _load_quant_config()
-    attn_impl = (os.environ.get("MODEL_ATTN_IMPL_27B", "eager") or "").strip() or "eager"
+    # MODEL_DEVICE_MAP_27B=cuda:0 pins every layer to the GPU: no fp32 CPU
+    # offload, no PCIe shuttling, and an OOM is raised instead of limping.
+    gpu_only = device_map_all_cuda(normalized_device_map)
+    quant_config = _load_quant_config(cpu_offload=not gpu_only)
+    # "auto" (the default) probes the GPU; set eager/sdpa to pin a kernel.
+    attn_impl = (os.environ.get("MODEL_ATTN_IMPL_27B", "auto") or "").strip() or "auto"
+    if attn_impl == "auto":
+        attn_impl = pick_attn_implementation(gpu_only=gpu_only)
     model_kwargs: Dict[str, Any] = {
         "torch_dtype": dtype,
         "device_map": normalized_device_map,
         "local_files_only": local_files_only,
         "low_cpu_mem_usage": True,
         "quantization_config": quant_config,
-        "offload_folder": os.environ.get("MODEL_OFFLOAD_DIR", "offload"),
-        # Avoid flash/SDPA kernel selection issues on older GPUs/offload mixes.
         "attn_implementation": attn_impl,
     }
-    if max_memory:
-        model_kwargs["max_memory"] = max_memory
+    if not gpu_only:
+        model_kwargs["offload_folder"] = os.environ.get("MODEL_OFFLOAD_DIR", "offload")
+        if max_memory:
+            model_kwargs["max_memory"] = max_memory
 
     _TOKENIZER = AutoTokenizer.from_pretrained(resolved, use_fast=True, local_files_only=local_files_only)
     _MODEL = AutoModelForCausalLM.from_pretrained(resolved, **model_kwargs)
     _MODEL.eval()
+    _KV_CACHE = build_static_cache(_MODEL, normalized_device_map, dtype)
+    compile_for_decode(_MODEL, _TOKENIZER, _KV_CACHE)
     _ACTIVE_SNAPSHOT = resolved
     _ACTIVE_LOAD_SIGNATURE = load_sig
     return _MODEL, _TOKENIZER
@@ -191,14 +204,14 @@ def load_model(
 
 def unload_model() -> None:
     """Release 27B references and request CUDA cache cleanup."""
-    global _MODEL, _TOKENIZER, _ACTIVE_SNAPSHOT, _ACTIVE_LOAD_SIGNATURE
+    global _MODEL, _TOKENIZER, _KV_CACHE, _ACTIVE_SNAPSHOT, _ACTIVE_LOAD_SIGNATURE
     _MODEL = None
     _TOKENIZER = None
+    _KV_CACHE = None
     _ACTIVE_SNAPSHOT = None
     _ACTIVE_LOAD_SIGNATURE = None
     gc.collect()
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
+    release_cuda_cache()
 
 
 def generate(
@@ -218,9 +231,7 @@ def generate(
     model, tokenizer = load_model(snapshot=snapshot, device_map=device_map, max_memory=max_memory)
 
     # Keep prompt construction aligned with instruction chat fine-tuning.
-    messages = [{"role": "user", "content": prompt}]
-    prompt_text = tokenizer.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
-    inputs = tokenizer(prompt_text, return_tensors="pt")
+    inputs = encode_chat_prompt(tokenizer, prompt, cfg.get("prefix_chars"))
     # Keep context bounded for 27B to control KV-cache VRAM on 16GB GPUs.
     try:
         max_input_tokens = int(os.environ.get("MODEL_MAX_INPUT_TOKENS_27B", "2048"))
@@ -255,6 +266,8 @@ def generate(
             repetition_penalty=cfg.get("rep_penalty", 1.1),
             do_sample=(cfg.get("t", 0) > 0),
             pad_token_id=safe_pad_token_id(tokenizer),
+            use_cache=True,
+            **static_cache_kwargs(_KV_CACHE, input_len, max_new_tokens),
         )
 
     response = tokenizer.decode(out[0][input_len:], skip_special_tokens=True)
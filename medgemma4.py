@@ -14,6 +14,8 @@ Design intent:
   GPU allocation churn between requests.
 - Apply safety caps from runtime config before generation so user-provided
   token settings cannot exceed model context limits.
+- Optionally load weights in 8-bit or NF4 4-bit (bitsandbytes) to cut the
+  bytes moved per decoded token on memory-bound GPUs.
 """
 
 from __future__ import annotations
@@ -27,11 +29,20 @@ import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
 from medgemma_common import (
+    bf16_supported,
+    build_static_cache,
     cap_new_tokens,
+    compile_for_decode,
+    default_dtype,
+    encode_chat_prompt,
+    device_map_all_cuda,
+    pick_attn_implementation,
     pick_input_device,
+    release_cuda_cache,
     resolve_model_max_length,
     resolve_snapshot,
     safe_pad_token_id,
+    static_cache_kwargs,
 )
 
 MODEL_ID = "google/medgemma-1.5-4b-it"
@@ -39,17 +50,31 @@ MODEL_ID = "google/medgemma-1.5-4b-it"
 _MODEL = None
 _TOKENIZER = None
 _ACTIVE_SNAPSHOT = None
+_KV_CACHE = None
+_ACTIVE_QUANT = None
 
+# Weight quantization for the 4B model: "none", "int8" or "nf4".
+DEFAULT_QUANT = (os.environ.get("MODEL_QUANT_4B", "none").strip().lower() or "none")
 
-def _default_dtype() -> torch.dtype:
-    """Select a stable default dtype based on runtime hardware and flags."""
-    if os.environ.get("FORCE_FP16", "").strip() == "1":
-        return torch.float16
-    if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
-        return torch.bfloat16
-    if torch.cuda.is_available():
-        return torch.float16
-    return torch.float32
+
+def _quant_config(quantization: str, device_map: str | dict) -> Any:
+    """Return a BitsAndBytes config for `quantization`, or None when it can't apply."""
+    if quantization not in {"int8", "nf4"} or not torch.cuda.is_available() or not device_map_all_cuda(device_map):
+        return None
+    try:
+        from transformers import BitsAndBytesConfig
+
+        __import__("bitsandbytes")
+    except Exception as exc:
+        print(f"[quant] bitsandbytes unavailable; loading 4B unquantized ({exc})", flush=True)
+        return None
+    if quantization == "int8":
+        return BitsAndBytesConfig(load_in_8bit=True)
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=torch.bfloat16 if bf16_supported() else torch.float16,
+    )
 
 
 def load_model(
@@ -57,21 +82,26 @@ def load_model(
     snapshot: str | None = None,
     device_map: str | dict = "cuda:0",
     dtype: torch.dtype | None = None,
-    attn_implementation: str | None = "eager",
+    attn_implementation: str | None = None,
     local_files_only: bool = True,
+    quantization: str | None = None,
 ) -> tuple[Any, Any]:
     """
     Load or reuse the 4B model.
 
     Reuse strategy:
-    - If snapshot path matches `_ACTIVE_SNAPSHOT`, return cached objects.
+    - If snapshot path and quantization match the active load, return cached objects.
     - Otherwise load tokenizer/model once and pin as active snapshot.
+
+    `quantization` ("none", "int8", "nf4") defaults to MODEL_QUANT_4B and
+    falls back to unquantized weights without CUDA or bitsandbytes.
     """
-    global _MODEL, _TOKENIZER, _ACTIVE_SNAPSHOT
+    global _MODEL, _TOKENIZER, _KV_CACHE, _ACTIVE_SNAPSHOT, _ACTIVE_QUANT
     if dtype is None:
-        dtype = _default_dtype()
+        dtype = default_dtype()
     resolved = resolve_snapshot(MODEL_ID, snapshot)
-    if _MODEL is not None and _TOKENIZER is not None and _ACTIVE_SNAPSHOT == resolved:
+    quant = (quantization or DEFAULT_QUANT).strip().lower()
+    if _MODEL is not None and _TOKENIZER is not None and _ACTIVE_SNAPSHOT == resolved and _ACTIVE_QUANT == quant:
         return _MODEL, _TOKENIZER
 
     model_kwargs: Dict[str, Any] = {
@@ -80,25 +110,39 @@ def load_model(
         "local_files_only": local_files_only,
         "low_cpu_mem_usage": True,
     }
+    # The 4B model sits on a single device, so PyTorch's fused SDPA kernel is
+    # safe here (math SDP stays enabled as a fallback); MODEL_ATTN_IMPL_4B=eager
+    # reverts and "auto" probes the GPU (flash_attention_2 on sm_80+).
+    if attn_implementation is None:
+        attn_implementation = (os.environ.get("MODEL_ATTN_IMPL_4B", "sdpa") or "").strip() or "sdpa"
+    if attn_implementation == "auto":
+        attn_implementation = pick_attn_implementation(gpu_only=device_map_all_cuda(device_map))
     if attn_implementation:
         model_kwargs["attn_implementation"] = attn_implementation
+    quant_config = _quant_config(quant, device_map)
+    if quant_config is not None:
+        model_kwargs["quantization_config"] = quant_config
 
     _TOKENIZER = AutoTokenizer.from_pretrained(resolved, use_fast=True, local_files_only=local_files_only)
     _MODEL = AutoModelForCausalLM.from_pretrained(resolved, **model_kwargs)
     _MODEL.eval()
+    _KV_CACHE = build_static_cache(_MODEL, device_map, dtype)
+    compile_for_decode(_MODEL, _TOKENIZER, _KV_CACHE)
     _ACTIVE_SNAPSHOT = resolved
+    _ACTIVE_QUANT = quant
     return _MODEL, _TOKENIZER
 
 
 def unload_model() -> None:
     """Release model/tokenizer references and clear CUDA cache when present."""
-    global _MODEL, _TOKENIZER, _ACTIVE_SNAPSHOT
+    global _MODEL, _TOKENIZER, _KV_CACHE, _ACTIVE_SNAPSHOT, _ACTIVE_QUANT
     _MODEL = None
     _TOKENIZER = None
+    _KV_CACHE = None
     _ACTIVE_SNAPSHOT = None
+    _ACTIVE_QUANT = None
     gc.collect()
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
+    release_cuda_cache()
 
 
 def generate(prompt: str, cfg: Dict[str, Any], *, snapshot: str | None = None, device_map: str | dict = "cuda:0") -> str:
@@ -111,14 +155,14 @@ def generate(prompt: str, cfg: Dict[str, Any], *, snapshot: str | None = None, d
     - `p`: top-p
     - `k`: top-k
     - `rep_penalty`: repetition penalty
+    - `prefix_chars`: length of the static prompt prefix whose token ids are reused
     """
+    # Weight quantization comes from MODEL_QUANT_4B (see DEFAULT_QUANT).
     model, tokenizer = load_model(snapshot=snapshot, device_map=device_map)
 
     # Use the tokenizer's chat template to keep prompt framing aligned with
     # the instruction-tuned MedGemma 4B format.
-    messages = [{"role": "user", "content": prompt}]
-    prompt_text = tokenizer.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
-    inputs = tokenizer(prompt_text, return_tensors="pt")
+    inputs = encode_chat_prompt(tokenizer, prompt, cfg.get("prefix_chars"))
     input_ids = inputs.get("input_ids")
     input_device = pick_input_device(model)
     inputs = {k: v.to(input_device) for k, v in inputs.items()}
@@ -138,6 +182,8 @@ def generate(prompt: str, cfg: Dict[str, Any], *, snapshot: str | None = None, d
             repetition_penalty=cfg.get("rep_penalty", 1.1),
             do_sample=(cfg.get("t", 0) > 0),
             pad_token_id=safe_pad_token_id(tokenizer),
+            use_cache=True,
+            **static_cache_kwargs(_KV_CACHE, input_len, max_new_tokens),
         )
 
     response = tokenizer.decode(out[0][input_len:], skip_special_tokens=True)
@@ -12,14 +12,22 @@ This module centralizes shared safeguards used by both 4B and 27B runners:
 - Resolving a complete local snapshot from HF cache roots
 - Guarding token lengths against model context limits
 - Selecting stable padding and input device behavior across device maps
+- Reusing token ids for the static leading block of chat prompts
+- Caching immutable CUDA device facts (bf16 support, name, capability)
+- One-time torch runtime patches shared by the API and inference processes
+- An optional pre-allocated (static) KV cache reused across requests
 """
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 
 import torch
 
@@ -35,6 +43,54 @@ def safe_pad_token_id(tok):
     return eos
 
 
+# Template-wrapped prompt prefixes -> cached input_ids, or None when splitting
+# that prefix off changes the tokenization and the full text must be encoded.
+_PREFIX_IDS: "OrderedDict[tuple, Any]" = OrderedDict()
+_PREFIX_IDS_LOCK = threading.Lock()
+_PREFIX_IDS_MAX = 16
+
+
+def encode_chat_prompt(tok, prompt: str, prefix_chars: int | None = None) -> Dict[str, Any]:
+    """
+    Apply the chat template to a single user turn and tokenize it.
+
+    `prefix_chars` marks the leading part of `prompt` that repeats across
+    requests (mission context, instructions, inventory). Its token ids are
+    cached and only the remainder is tokenized per request. A prefix is split
+    off only after its first use proves that head + rest ids equal the full
+    tokenization; otherwise it is remembered as unsplittable.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    text = tok.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
+    start = text.find(prompt) if prefix_chars and 0 < prefix_chars < len(prompt) else -1
+    if start < 0:
+        return tok(text, return_tensors="pt")
+    cut = start + prefix_chars
+    head, rest = text[:cut], text[cut:]
+    key = (getattr(tok, "name_or_path", ""), hashlib.sha256(head.encode("utf-8")).hexdigest())
+    with _PREFIX_IDS_LOCK:
+        known = key in _PREFIX_IDS
+        head_ids = _PREFIX_IDS.get(key)
+        if known:
+            _PREFIX_IDS.move_to_end(key)
+    if known and head_ids is None:
+        return tok(text, return_tensors="pt")
+    rest_ids = tok(rest, add_special_tokens=False, return_tensors="pt")["input_ids"]
+    if not known:
+        full = tok(text, return_tensors="pt")
+        head_ids = tok(head, return_tensors="pt")["input_ids"]
+        splittable = set(full.keys()) <= {"input_ids", "attention_mask"} and torch.equal(
+            torch.cat([head_ids, rest_ids], dim=1), full["input_ids"]
+        )
+        with _PREFIX_IDS_LOCK:
+            _PREFIX_IDS[key] = head_ids if splittable else None
+            while len(_PREFIX_IDS) > _PREFIX_IDS_MAX:
+                _PREFIX_IDS.popitem(last=False)
+        return full
+    input_ids = torch.cat([head_ids, rest_ids], dim=1)
+    return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+
 def iter_cache_roots() -> List[Path]:
     """Yield known HuggingFace cache roots, deduplicated and existing only."""
     roots: List[Path] = []
@@ -137,6 +193,60 @@ def resolve_snapshot(model_id: str, snapshot_override: str | None = None) -> str
     )
 
 
+@lru_cache(maxsize=1)
+def cuda_device_info() -> Tuple[bool, str, Tuple[int, int]]:
+    """Return (bf16 supported, name, compute capability) for cuda:0, queried once per process."""
+    if not torch.cuda.is_available():
+        return False, "", (0, 0)
+    try:
+        bf16_ok = bool(torch.cuda.is_bf16_supported())
+    except Exception:
+        bf16_ok = False
+    try:
+        name = torch.cuda.get_device_name(0)
+    except Exception:
+        name = ""
+    try:
+        capability = tuple(torch.cuda.get_device_capability(0))
+    except Exception:
+        capability = (0, 0)
+    return bf16_ok, name, capability
+
+
+def bf16_supported() -> bool:
+    """Return True when cuda:0 supports bfloat16."""
+    return cuda_device_info()[0]
+
+
+def default_dtype() -> torch.dtype:
+    """Select the compute dtype: FORCE_FP16, else bf16, fp16 on CUDA, fp32 on CPU."""
+    if os.environ.get("FORCE_FP16", "").strip() == "1":
+        return torch.float16
+    if not torch.cuda.is_available():
+        return torch.float32
+    return torch.bfloat16 if bf16_supported() else torch.float16
+
+
+def release_cuda_cache(min_free_ratio: float = 0.2) -> bool:
+    """
+    Empty the CUDA caching allocator only under memory pressure.
+
+    `empty_cache()` forces a device sync and hands blocks back to the driver;
+    when a similar-sized model loads next those blocks would have been reused.
+    Returns True when the cache was actually emptied.
+    """
+    if not torch.cuda.is_available():
+        return False
+    try:
+        free, total = torch.cuda.mem_get_info()
+    except Exception:
+        free, total = 0, 0
+    if total and (free / total) >= min_free_ratio:
+        return False
+    torch.cuda.empty_cache()
+    return True
+
+
 def resolve_model_max_length(model, tok=None):
     """Infer effective model context length from config/tokenizer metadata."""
     cfg = getattr(model, "config", None)
@@ -208,3 +318,202 @@ def device_map_all_cuda(device_map: str | Dict[str, str]) -> bool:
     if isinstance(device_map, dict):
         return all(str(v).startswith("cuda") for v in device_map.values())
     return False
+
+
+# Opt-in static KV cache: one buffer of MAX_CACHE_LEN positions is allocated
+# right after the model loads and reset between requests, instead of a fresh
+# dynamic cache growing per prompt (which fragments VRAM on 16GB cards).
+STATIC_KV_CACHE = os.environ.get("MODEL_STATIC_CACHE", "0").strip() == "1"
+# Opt-in compile of the decode step; needs (and implies) the static cache
+# because CUDA graph capture breaks on a cache whose shape changes per step.
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "0").strip() == "1"
+try:
+    MAX_CACHE_LEN = int(os.environ.get("MAX_CACHE_LEN", "4096"))
+except Exception:
+    MAX_CACHE_LEN = 4096
+
+
+def build_static_cache(model, device_map: str | Dict[str, str], dtype) -> Any:
+    """
+    Pre-allocate a batch-1 KV cache of MAX_CACHE_LEN positions for `model`.
+
+    Returns None when disabled, when the model is not entirely on CUDA
+    (offloaded layers can't share one cache device) or when the installed
+    transformers has no usable StaticCache.
+    """
+    if not (STATIC_KV_CACHE or TORCH_COMPILE) or MAX_CACHE_LEN <= 0:
+        return None
+    if not torch.cuda.is_available() or not device_map_all_cuda(device_map):
+        return None
+    try:
+        import transformers
+    except Exception:
+        return None
+    config = getattr(model, "config", None)
+    device = getattr(model, "device", None)
+    try:
+        # transformers>=4.56 derives per-layer (full vs sliding) shapes from config.
+        return transformers.StaticCache(config=config, max_cache_len=MAX_CACHE_LEN)
+    except TypeError:
+        pass
+    except Exception as exc:
+        print(f"[kv-cache] static cache unavailable: {exc}", flush=True)
+        return None
+    # Older releases need the sliding-window aware class for Gemma3.
+    text_cfg = getattr(config, "text_config", None) or config
+    cache_cls = transformers.StaticCache
+    if getattr(text_cfg, "sliding_window", None) and hasattr(transformers, "HybridCache"):
+        cache_cls = transformers.HybridCache
+    try:
+        return cache_cls(
+            config=config,
+            max_batch_size=1,
+            max_cache_len=MAX_CACHE_LEN,
+            device=device,
+            dtype=dtype,
+        )
+    except Exception as exc:
+        print(f"[kv-cache] static cache unavailable: {exc}", flush=True)
+        return None
+
+
+def static_cache_kwargs(cache, input_len: int, max_new_tokens) -> Dict[str, Any]:
+    """
+    Return `generate()` kwargs that reuse `cache`, or {} when it can't fit.
+
+    The cache is reset first; callers run under the model lock, so no other
+    request can be using it.
+    """
+    if cache is None or not isinstance(max_new_tokens, int):
+        return {}
+    if input_len + max_new_tokens > MAX_CACHE_LEN:
+        return {}
+    try:
+        cache.reset()
+    except Exception:
+        return {}
+    return {"past_key_values": cache}
+
+
+def compile_for_decode(model, tok, cache) -> bool:
+    """
+    Let transformers compile the decode step with CUDA graphs, warmed up on `cache`.
+
+    generate() compiles only the one-token decode forward (fixed shape against
+    the static cache) while prefill stays eager, so new prompt lengths never
+    trigger a recompile. Applies with TORCH_COMPILE=1, torch>=2.2, a static
+    cache and a transformers with CompileConfig; otherwise the auto-compile
+    transformers does for static caches is switched off. The warm-up captures
+    the decode graph before serving; callers hold the model lock.
+    Returns True when decode compilation is enabled.
+    """
+    gen_cfg = getattr(model, "generation_config", None)
+    if gen_cfg is None:
+        return False
+    enabled = TORCH_COMPILE and cache is not None and torch_version_ge(2, 2)
+    compile_config_cls = None
+    if enabled:
+        try:
+            from transformers import CompileConfig as compile_config_cls
+        except ImportError:
+            print("[compile] transformers has no CompileConfig; decode stays eager", flush=True)
+    if compile_config_cls is None:
+        gen_cfg.disable_compile = True
+        return False
+    gen_cfg.compile_config = compile_config_cls(fullgraph=False, mode="reduce-overhead", dynamic=False)
+    gen_cfg.disable_compile = False
+    try:
+        input_ids = tok("Hello", return_tensors="pt").input_ids.to(pick_input_device(model))
+        cache.reset()
+        with torch.inference_mode():
+            # A few decode steps so reduce-overhead records its CUDA graph.
+            model.generate(
+                input_ids=input_ids,
+                max_new_tokens=4,
+                do_sample=False,
+                pad_token_id=safe_pad_token_id(tok),
+                past_key_values=cache,
+            )
+        return True
+    except Exception as exc:
+        print(f"[compile] decode compile skipped: {exc}", flush=True)
+        gen_cfg.disable_compile = True
+        return False
+
+
+def torch_version_ge(major: int, minor: int) -> bool:
+    """Return True when the installed torch is at least `major.minor`."""
+    try:
+        base = torch.__version__.split("+", 1)[0]
+        parts = base.split(".")
+        return (int(parts[0]), int(parts[1])) >= (major, minor)
+    except Exception:
+        return False
+
+
+def patch_gemma3_mask_for_torch() -> None:
+    """
+    Drop token_type_ids from Gemma3 causal-mask construction on torch<2.6.
+
+    Older torch cannot use `or_mask_function`; text-only prompts don't need
+    the token type split, so ignoring it keeps generation working.
+    """
+    if torch_version_ge(2, 6):
+        return
+    try:
+        import transformers.models.gemma3.modeling_gemma3 as gemma_model
+        _orig_create_causal_mask_mapping = gemma_model.create_causal_mask_mapping
+
+        def _create_causal_mask_mapping_no_or(*args, **kwargs):
+            """Call the original mask builder with token_type_ids cleared."""
+            if len(args) >= 7:
+                args = list(args)
+                args[6] = None
+            if "token_type_ids" in kwargs:
+                kwargs = dict(kwargs)
+                kwargs["token_type_ids"] = None
+            return _orig_create_causal_mask_mapping(*args, **kwargs)
+
+        gemma_model.create_causal_mask_mapping = _create_causal_mask_mapping_no_or
+        print("[startup] patched Gemma3 mask for torch<2.6", flush=True)
+    except Exception as exc:
+        print(f"[startup] Gemma3 mask patch skipped: {exc}", flush=True)
+
+
+def pick_attn_implementation(gpu_only: bool = True) -> str:
+    """
+    Choose an attention kernel from the CUDA device's compute capability.
+
+    sm_80+ (Ampere/Ada) gets flash_attention_2 when USE_FLASH_ATTENTION=1,
+    the flash_attn package is installed and every layer is on the GPU, and
+    fused SDPA otherwise. Older cards (e.g. Turing RTX 5000) and CPU keep
+    eager attention.
+    """
+    if cuda_device_info()[2] < (8, 0):
+        return "eager"
+    if gpu_only and os.environ.get("USE_FLASH_ATTENTION", "0").strip() == "1":
+        try:
+            __import__("flash_attn")
+            return "flash_attention_2"
+        except Exception:
+            pass
+    return "sdpa"
+
+
+def configure_sdp_backends() -> None:
+    """
+    Select CUDA scaled-dot-product attention backends.
+
+    Math SDP stays enabled as a guaranteed fallback to avoid
+    "No available kernel. Aborting execution."; flash/mem-efficient kernels
+    are opt-in via USE_FAST_SDP=1.
+    """
+    if not torch.cuda.is_available():
+        return
+    try:
+        use_fast_sdp = os.environ.get("USE_FAST_SDP", "0").strip() == "1"
+        torch.backends.cuda.enable_flash_sdp(use_fast_sdp)
+        torch.backends.cuda.enable_mem_efficient_sdp(use_fast_sdp)
+        torch.backends.cuda.enable_math_sdp(True)
+    except Exception:
+        pass
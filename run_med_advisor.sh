@@ -62,12 +62,16 @@ export ALLOW_CPU_FALLBACK_ON_CUDA_ERROR="${ALLOW_CPU_FALLBACK_ON_CUDA_ERROR:-0}"
 export MODEL_MAX_GPU_MEM="${MODEL_MAX_GPU_MEM:-15GiB}"
 export MODEL_MAX_GPU_MEM_27B="${MODEL_MAX_GPU_MEM_27B:-8GiB}"
 export MODEL_MAX_CPU_MEM=64GiB
+# 4B weight quantization: none (default), int8 or nf4 (CUDA + bitsandbytes only). This env var is the only control.
+export MODEL_QUANT_4B="${MODEL_QUANT_4B:-none}"
 # 0 disables hard cap so token count comes from Settings (tr_tok/in_tok).
 export MODEL_MAX_NEW_TOKENS_27B="${MODEL_MAX_NEW_TOKENS_27B:-0}"
 export MODEL_MAX_INPUT_TOKENS_27B="${MODEL_MAX_INPUT_TOKENS_27B:-2048}"
+# manual[:N] splits layers GPU/CPU; cuda:0 keeps all of 27B in NF4 on the GPU (no CPU offload).
 export MODEL_DEVICE_MAP_27B="${MODEL_DEVICE_MAP_27B:-manual}"
 export MODEL_GPU_LAYERS_27B="${MODEL_GPU_LAYERS_27B:-14}"
-export MODEL_ATTN_IMPL_27B="${MODEL_ATTN_IMPL_27B:-eager}"
+# auto = eager on pre-Ampere GPUs (e.g. Turing), SDPA or flash_attention_2 on sm_80+.
+export MODEL_ATTN_IMPL_27B="${MODEL_ATTN_IMPL_27B:-auto}"
 # Reduce allocator fragmentation on long sessions.
 export PYTORCH_CUDA_ALLOC_CONF="${PYTORCH_CUDA_ALLOC_CONF:-expandable_segments:True}"
 